@@ -1,10 +1,15 @@
-from pydantic_ai import Agent as PydanticAgent
+from pydantic_ai import Agent as PydanticAgent, RunContext
 import asyncio
 import logfire
 from dotenv import load_dotenv
 import os
 import json
-import hashlib
+from colors import generate_color_from_title, get_text_color
+from cart import Cart
+from history import CART_CHANGES_PREFIX, HistoryPolicy, strip_instructions
+from llm_scheduler import ModelScheduler
+from metrics import record_usage, timed
+from models import AddAction, BatchAction, RemoveAction, TextReply, TurnReplies
 
 load_dotenv(override=True)
 logfire.configure()
@@ -37,110 +42,188 @@ if not google_api_key.startswith("AIza"):
 
 model = "gemini-2.5-flash"
 
+
+def describe_cart(cart) -> str:
+    """The live cart listing given to the model on every run"""
+    if not cart:
+        return "The cart is currently empty."
+    lines = "\n".join(f"- {line.key}: {line.quantity} item(s)" for line in cart)
+    return f"Current cart contents:\n{lines}"
+
+
+def describe_changes(changes) -> str:
+    """Compact note of what changed in the cart since the previous message, e.g. '+3 Apples, -2 Grapes'"""
+    return ", ".join(f"{delta:+d} {line.key}" for line, delta in changes)
+
+
 class Agent:
-    def __init__(self):
-        # System prompt to handle e-commerce product additions and removals
+    def __init__(self, history_policy: HistoryPolicy = None, scheduler: ModelScheduler = None):
+        # System prompt to handle e-commerce product additions and removals.
+        # The response format comes from the typed outputs below, so the prompt
+        # only has to describe behavior.
         system_prompt = """
-You are a helpful e-commerce assistant. 
-
-When the user wants to ADD products (can be multiple items):
-Respond with: {"action": "add", "items": [{"name": "ProductName", "quantity": number, "color": "#hexcolor", "attributes": "description"}]}
-Identify the natural color of each product and provide it as a hex color code
-For clothing items, include color/size in attributes
-Examples: 
-  * "add grapes" → {"action": "add", "items": [{"name": "Grapes", "quantity": 1, "color": "#8B4789", "attributes": ""}]}
-  * "3 apples" → {"action": "add", "items": [{"name": "Apples", "quantity": 3, "color": "#DC143C", "attributes": ""}]}
-  * "purple top with white pant" → {"action": "add", "items": [{"name": "Top", "quantity": 1, "color": "#800080", "attributes": "Purple"}, {"name": "Pant", "quantity": 1, "color": "#FFFFFF", "attributes": "White"}]}
-  * "red shirt size M" → {"action": "add", "items": [{"name": "Shirt", "quantity": 1, "color": "#DC143C", "attributes": "Red, Size M"}]}
-
-When the user wants to REMOVE a product:
-Respond with: {"action": "remove", "name": "ProductName", "quantity": number}
-If no quantity specified, set quantity to 0 (remove all)
-Examples: 
-  * "remove grapes" → {"action": "remove", "name": "Grapes", "quantity": 0}
-  * "remove 1 laptop" → {"action": "remove", "name": "Laptop", "quantity": 1}
-  * "remove 2 apples" → {"action": "remove", "name": "Apples", "quantity": 2}
-
-When the user asks about their cart (like "how many items", "what's in my cart", "total items"):
-Look at the cart contents provided in the message context
-Answer their question naturally based on the cart data
-Do NOT return JSON, just respond with text
-
-Always capitalize product names properly. ONLY return JSON for add/remove actions.
-
-For other questions, respond normally with text.
+You are a helpful e-commerce assistant managing the user's shopping cart.
+
+To ADD products (can be several at once) use AddAction. Give each product its natural
+color as a hex code; for clothing put color/size in attributes.
+  * "purple top with white pant" -> Top (#800080, "Purple") and Pant (#FFFFFF, "White")
+  * "red shirt size M" -> Shirt (#DC143C, "Red, Size M")
+
+To REMOVE a product use RemoveAction; quantity 0 (the default) removes all of it.
+
+When one message asks for several changes ("remove the apples and add two pears",
+"make it 5 oranges and drop the milk") use a single BatchAction listing the add,
+remove and set operations in the order given. "set" gives a product an exact quantity.
+
+For questions about the cart ("how many items", "what's in my cart") answer from the
+current cart contents in your instructions using TextReply. Use TextReply for anything else too.
+
+Always capitalize product names properly.
 """
-        # pydantic-ai will automatically use GOOGLE_API_KEY from environment
-        self.agent = PydanticAgent(model, system_prompt=system_prompt)
+        # pydantic-ai will automatically use GOOGLE_API_KEY from environment.
+        # Each action type becomes its own output tool, so we get validated models back.
+        self.agent = PydanticAgent(
+            model,
+            system_prompt=system_prompt,
+            output_type=[AddAction, RemoveAction, BatchAction, TextReply],
+            deps_type=Cart,
+        )
+
+        # The live cart goes in the instructions, which are rebuilt on every run
+        # and only the latest ones are sent, so old snapshots never pile up.
+        @self.agent.instructions
+        def cart_contents(ctx: RunContext[Cart]) -> str:
+            return describe_cart(ctx.deps)
+
         self.message_history = []
+        # Tokens of turns trimmed out of message_history so far (see HistoryPolicy.apply)
+        self.history_tokens_folded = 0
+        # Sliding window + running summary so long sessions don't resend everything
+        self.history_policy = history_policy or HistoryPolicy()
+        # Concurrency cap, load shedding, deadlines and retries for every model call
+        self.scheduler = scheduler or ModelScheduler()
+        self.last_history_stats = None
+        self.tokens_saved_total = 0
     
-    async def get_response_async(self, user_message: str, cart_context: dict = None) -> str:
-        """Get a response from the AI agent asynchronously"""
-        # Add cart context to the message if available
-        if cart_context:
-            cart_info = "\n\nCurrent cart contents:\n"
-            if not cart_context:
-                cart_info += "Cart is empty"
-            else:
-                for item_name, item_data in cart_context.items():
-                    cart_info += f"- {item_name}: {item_data['quantity']} item(s)\n"
-            
-            enhanced_message = user_message + cart_info
-        else:
-            enhanced_message = user_message
-        
-        # Pass the message history to maintain context
-        response = await self.agent.run(enhanced_message, message_history=self.message_history)
+    def _prepare_run(self, user_message: str, cart_context, history):
+        """Build the prompt, run deps, the trimmed message history and its HistoryStats for one run"""
+        cart = cart_context if cart_context is not None else Cart()
+        # Only what changed since the last message is recorded in the conversation. The
+        # changes stay pending until the run succeeds, so a failed one doesn't lose them.
+        changes = cart.peek_changes()
+        if changes:
+            user_message += f"{CART_CHANGES_PREFIX}{describe_changes(changes)}]"
+
+        # Trim the history to the policy's window before sending it
+        with timed('history'):
+            message_history, stats = self.history_policy.apply(
+                history.message_history, getattr(history, 'history_tokens_folded', 0)
+            )
+        self.last_history_stats = stats
+        self.tokens_saved_total += stats.tokens_saved
+        if stats.turns_folded:
+            logfire.info(
+                "history trimmed: {tokens_saved} tokens saved",
+                tokens_saved=stats.tokens_saved,
+                turns_kept=stats.turns_kept,
+                turns_folded=stats.turns_folded,
+            )
+        return user_message, cart, message_history, stats
+
+    @staticmethod
+    def _record_history(history, messages, stats, cart):
+        """
+        Keep a finished run's messages, minus the cart listing, as the conversation so
+        far; the cart changes it told the model about are now part of it
+        """
+        cart.drain_changes()
+        history.message_history = strip_instructions(messages)
+        if hasattr(history, 'history_tokens_folded'):
+            history.history_tokens_folded = stats.tokens_folded
+
+    async def get_response_async(self, user_message: str, cart_context=None, history=None):
+        """
+        Get a response from the AI agent asynchronously: an AddAction, RemoveAction,
+        BatchAction or TextReply.
+
+        history is any object with a message_history attribute (e.g. a shopper's
+        SessionState) so each conversation keeps its own context; a history_tokens_folded
+        attribute, if it has one, keeps the trimming stats honest. Defaults to this agent.
+        """
+        if history is None:
+            history = self
+        enhanced_message, cart, message_history, stats = self._prepare_run(user_message, cart_context, history)
+
+        # Pass the message history to maintain context. The scheduler may run this more
+        # than once (retries, hedges), so the history is only updated afterwards.
+        with timed('model'):
+            response = await self.scheduler.run(
+                lambda: self.agent.run(enhanced_message, message_history=message_history, deps=cart)
+            )
+        record_usage(response.usage, 'single')
         
-        # Update message history with new messages from this run
-        self.message_history = response.all_messages()
+        # Update message history with new messages from this run, minus the cart listing
+        self._record_history(history, response.all_messages(), stats, cart)
         
         return response.output
-    
-    def get_response(self, user_message: str) -> str:
+
+    async def stream_response_async(self, user_message: str, cart_context=None, history=None):
+        """
+        Stream the agent's response while the model generates it.
+
+        Same arguments as get_response_async. Yields partial actions (see get_response_async)
+        as they grow; the last one yielded is the complete, validated
+        response. The history is updated once the stream is complete.
+
+        Streams get the scheduler's concurrency cap and deadline, but can't be
+        retried or hedged once output has been sent.
+        """
+        if history is None:
+            history = self
+        enhanced_message, cart, message_history, stats = self._prepare_run(user_message, cart_context, history)
+
+        with timed('model'):
+            async with self.scheduler.deadline_for(), self.scheduler.slot():
+                async with self.agent.run_stream(enhanced_message, message_history=message_history, deps=cart) as response:
+                    async for partial in response.stream_output(debounce_by=None):
+                        yield partial
+                    output = await response.get_output()
+        record_usage(response.usage, 'stream')
+
+        self._record_history(history, response.all_messages(), stats, cart)
+        yield output
+
+    async def get_batch_response_async(self, user_messages, cart_context=None, history=None):
+        """
+        Answer several messages that arrived together in one agent call.
+
+        Returns one action per message, in order (see get_response_async). Messages
+        the model skipped get a TextReply asking the shopper to send them again.
+        """
+        if history is None:
+            history = self
+        numbered = "\n".join(f"{n}. {message}" for n, message in enumerate(user_messages, 1))
+        prompt = (
+            "The shopper sent these messages in a row. Reply to each one, in order, "
+            "with one reply per message:\n" + numbered
+        )
+        enhanced_message, cart, message_history, stats = self._prepare_run(prompt, cart_context, history)
+
+        with timed('model'):
+            response = await self.scheduler.run(lambda: self.agent.run(
+                enhanced_message, message_history=message_history, deps=cart, output_type=TurnReplies,
+            ))
+        record_usage(response.usage, 'batch')
+        self._record_history(history, response.all_messages(), stats, cart)
+
+        replies = response.output.replies[:len(user_messages)]
+        missed = TextReply(text="Sorry, I lost track of that message - please send it again.")
+        return replies + [missed] * (len(user_messages) - len(replies))
+
+    def get_response(self, user_message: str):
         """Synchronous wrapper for get_response_async"""
         return asyncio.run(self.get_response_async(user_message))
     
-    @staticmethod
-    def generate_color_from_title(title: str) -> str:
-        """Generate a consistent color from a title using hash"""
-        # Generate hash from title
-        hash_object = hashlib.md5(title.encode())
-        hash_hex = hash_object.hexdigest()
-        
-        # Use first 6 characters as color, ensure it's not too dark
-        r = int(hash_hex[0:2], 16)
-        g = int(hash_hex[2:4], 16)
-        b = int(hash_hex[4:6], 16)
-        
-        # Make colors lighter by ensuring minimum brightness
-        r = max(r, 100)
-        g = max(g, 100)
-        b = max(b, 100)
-        
-        return f'#{r:02x}{g:02x}{b:02x}'
-    
-    @staticmethod
-    def get_text_color(bg_color: str) -> str:
-        """Determine if text should be white or black based on background color brightness"""
-        try:
-            # Remove # if present and handle empty/invalid colors
-            hex_color = bg_color.lstrip('#').strip()
-            
-            # Default to black text if color is invalid
-            if not hex_color or len(hex_color) < 6:
-                return '#000000'
-            
-            # Convert to RGB
-            r = int(hex_color[0:2], 16)
-            g = int(hex_color[2:4], 16)
-            b = int(hex_color[4:6], 16)
-            
-            # Calculate relative luminance (perceived brightness)
-            luminance = (0.299 * r + 0.587 * g + 0.114 * b) / 255
-            
-            # Return black text for light backgrounds, white text for dark backgrounds
-            return '#000000' if luminance > 0.5 else '#FFFFFF'
-        except (ValueError, IndexError):
-            # Default to black text on error
-            return '#000000'
+    # Memoized color helpers (see colors.py), kept here for existing callers
+    generate_color_from_title = staticmethod(generate_color_from_title)
+    get_text_color = staticmethod(get_text_color)
@@ -1,297 +1,479 @@
 from fasthtml.common import *
 from agent import Agent
+from cart import Cart, make_key
+from components import (
+    STYLESHEET, STYLESHEET_URL, bot_bubble, cart_updates, chat_bubbles, page_layout, session_view,
+    streaming_bubbles, user_bubble,
+)
+from session_store import SessionStore, SqliteSessionStore
+from turn_queue import Turn, TurnQueue
+from fast_path import FastPathParser, known_product
+from cart_query import CartQuery, CartQueryParser
+from llm_scheduler import DeadlineExceeded, ModelScheduler, Overloaded
+from metrics import REGISTRY, STAGE_SECONDS, timed
+from models import AddAction, BatchAction, RemoveAction, SetQuantityAction, TextReply
+from product_index import load_catalog
+from static_asset import StaticAsset
+from response_cache import ActionCache, DiskBackend, MemoryBackend
+from itertools import groupby
 import json
-
-app, rt = fast_app()
+import os
+import time
+import uuid
+
+# htmx SSE extension, used to stream agent replies into the chat
+sse_ext = Script(src="https://cdn.jsdelivr.net/npm/htmx-ext-sse@2.2.2/sse.js")
+
+# Let htmx swap in our 503/504 "busy" replies instead of dropping them like other errors
+htmx_config = Meta(name='htmx-config', content=json.dumps({'responseHandling': [
+    {'code': '204', 'swap': False},
+    {'code': '[23]..', 'swap': True},
+    {'code': '50[34]', 'swap': True},
+    {'code': '[45]..', 'swap': False, 'error': True},
+]}))
+
+app, rt = fast_app(hdrs=(sse_ext, htmx_config, Link(rel='stylesheet', href=STYLESHEET_URL)))
+
+# Every model call goes through one scheduler: at most ECOM_MODEL_CONCURRENCY at once,
+# ECOM_MODEL_QUEUE more waiting (the rest get a fast 503), each with a deadline of
+# ECOM_MODEL_DEADLINE seconds. Set ECOM_HEDGE_AFTER to hedge calls slower than that.
+hedge_after = os.getenv("ECOM_HEDGE_AFTER")
+scheduler = ModelScheduler(
+    max_concurrency=int(os.getenv("ECOM_MODEL_CONCURRENCY", "8")),
+    max_queue=int(os.getenv("ECOM_MODEL_QUEUE", "64")),
+    deadline=float(os.getenv("ECOM_MODEL_DEADLINE", "30")),
+    hedge_after=float(hedge_after) if hedge_after else None,
+)
 
 # Initialize agent
-agent = Agent()
+agent = Agent(scheduler=scheduler)
+
+BUSY_MESSAGE = "The assistant is busy right now - please try again in a moment."
+SLOW_MESSAGE = "The assistant took too long to answer - please try again."
+
+# Append only the new chat bubbles and changed cart cards on each /submit,
+# instead of re-rendering the whole transcript and cart
+INCREMENTAL_RENDER = True
+
+# Stream agent replies token by token over server-sent events (needs INCREMENTAL_RENDER)
+STREAM_RESPONSES = True
+
+# Fuzzy matches of cart items below this confidence are confirmed with the shopper first
+MATCH_CONFIDENCE = 0.75
+
+# Optional product catalog, one name per line: added items take the catalog's spelling
+# when they match it this confidently, so "tshirt" and "T-Shirt" end up on one line
+CATALOG_CONFIDENCE = 0.85
+catalog_path = os.getenv("ECOM_CATALOG_PATH")
+catalog = load_catalog(catalog_path) if catalog_path else None
+
+
+def catalog_match(name: str):
+    """The catalog's spelling of name if there is a catalog and a confident match, else None"""
+    if catalog is None:
+        return None
+    found = catalog.resolve(name)
+    if found and not found.ambiguous and found.confidence >= CATALOG_CONFIDENCE:
+        return found.values[0]
+    return None
+
+
+def is_known_product(name: str) -> bool:
+    """A product the local parser may act on without the LLM: a common product or a catalog one"""
+    return known_product(name) or catalog_match(name) is not None
+
+
+# Local parser for simple add/remove commands, with hit/miss counters
+fast_path = FastPathParser(is_known=is_known_product)
+
+# Questions like "how many items are in my cart?" are answered from the cart, not the
+# LLM; questions about a product only when it's one the fast path knows too
+cart_queries = CartQueryParser(is_known=is_known_product)
+
+# Parsed agent actions keyed by normalized prompt. Set ECOM_CACHE_PATH to keep
+# the cache on disk across restarts.
+cache_path = os.getenv("ECOM_CACHE_PATH")
+action_cache = ActionCache(
+    backend=DiskBackend(cache_path) if cache_path else MemoryBackend(max_entries=5000),
+    ttl=24 * 60 * 60,
+)
 
-# Store messages as tuples (user_message, response)
-messages = []
+# Number of uvicorn worker processes. More than one needs the shared SQLite state store.
+WORKERS = int(os.getenv("ECOM_WORKERS", "1"))
+
+# Per-shopper cart, chat transcript and agent history, keyed by session id. Set
+# ECOM_STATE_PATH to keep them in SQLite, shared by every worker and kept across restarts.
+state_path = os.getenv("ECOM_STATE_PATH") or ("sessions.db" if WORKERS > 1 else None)
+if state_path:
+    store = SqliteSessionStore(state_path, max_sessions=10_000, idle_ttl=30 * 60)
+else:
+    store = SessionStore(max_sessions=10_000, idle_ttl=30 * 60)
+
+
+def session_id(session) -> str:
+    """The store key for the shopper behind this session cookie, assigning one if needed"""
+    sid = session.get('sid')
+    if not sid:
+        sid = session['sid'] = store.new_session_id()
+    return sid
+
+
+def render_page(title: str, *content) -> str:
+    """
+    A full page as FastHTML would render a route returning Titled(title, *content),
+    minus anything that depends on the request, so it can be rendered ahead of time.
+    """
+    head = Head(Title(title), *app.hdrs)
+    body = Body(Main(H1(title), *content, cls='container'), *app.ftrs, **app.bodykw)
+    return to_xml(Html(head, body, **app.htmlkw))
+
+
+# Served from memory, pre-compressed, with ETag/Last-Modified so reloads are a 304.
+# The URL changes whenever the stylesheet does, so it can be cached for good.
+stylesheet_asset = StaticAsset(STYLESHEET, 'text/css', cache_control='public, max-age=31536000, immutable')
+shell = StaticAsset(
+    render_page("E-Commerce App", *page_layout('beforeend' if INCREMENTAL_RENDER else 'innerHTML')),
+    'text/html; charset=utf-8',
+)
+
+
+@rt('/styles/{version}')
+async def stylesheet(version: str, req):
+    return stylesheet_asset.response(req)
 
-# Store cart items as dict {product_name: {"quantity": int, "color": str}}
-cart = {}
 
 @rt('/')
-def get():
-    global messages, cart
-    messages = []
-    cart = {}
-
-    return Titled(
-        "E-Commerce App",
-
-        # TOP BAR
-        Div(
-            H1(" E-Commerce Assistant", 
-               style="margin:0; padding:18px; font-size:30px; font-weight:700;"),
-            style="""
-                text-align:center;
-                background:#ffffff;
-                box-shadow:0 2px 6px rgba(0,0,0,0.1);
-                margin-bottom:10px;
-            """
-        ),
-
-        # MAIN LAYOUT
-        Div(
-            # LEFT: CHAT PANEL
-            Div(
-                H3("Chat", style='margin-bottom: 15px; font-weight:600;'),
-                Div(
-                    id='chat-result',
-                    style='''
-                        flex: 1;
-                        overflow-y: auto;
-                        padding: 20px;
-                        border-radius: 12px;
-                        margin-bottom: 10px;
-                        max-height: calc(80vh - 120px);
-                        background: #ffffff;
-                        box-shadow: 0 4px 12px rgba(0,0,0,0.08);
-                    '''
-                ),
-                style='''
-                    flex: 1;
-                    display: flex;
-                    flex-direction: column;
-                    padding: 25px;
-                    border-right: 2px solid #eee;
-                    background: #f7f9fc;
-                '''
-            ),
-
-            # RIGHT: CART PANEL
-            Div(
-                H3("Cart", style='margin-bottom: 15px; font-weight:600;'),
-                Div(
-                    id='cart-result',
-                    style='''
-                        flex: 1;
-                        overflow-y: auto;
-                        padding: 20px;
-                        border-radius: 12px;
-                        background-color: #ffffff;
-                        box-shadow: 0 4px 12px rgba(0,0,0,0.08);
-                        max-height: calc(80vh - 120px);
-                    '''
-                ),
-                style='''
-                    flex: 1;
-                    display: flex;
-                    flex-direction: column;
-                    padding: 25px;
-                    background:#f7f9fc;
-                '''
-            ),
-
-            style='''
-                display: flex;
-                height: 75vh;
-                background: #f0f2f5;
-                border-radius: 15px;
-                overflow: hidden;
-            '''
-        ),
-
-        # BOTTOM INPUT AREA
-        Form(
-            Div(
-                Input(
-                    id='prompt', name='prompt',
-                    placeholder='Type a message...',
-                    required=True,
-                    style='''
-                        flex: 4;
-                        padding: 12px 16px;
-                        border: 1px solid #ccc;
-                        border-radius: 8px;
-                        font-size: 16px;
-                        background:white;
-                    '''
-                ),
-                Button(
-                    'Send',
-                    type='submit',
-                    style='''
-                        flex: 1;
-                        padding: 12px;
-                        margin-left: 10px;
-                        background: #0066ff;
-                        color: white;
-                        border: none;
-                        border-radius: 8px;
-                        font-size: 16px;
-                        cursor:pointer;
-                    '''
-                ),
-                style='display: flex; align-items: center;'
-            ),
-            hx_post='/submit',
-            hx_target='#chat-result',
-            hx_swap='innerHTML',
-            **{'hx-on::after-request': 'this.reset()'},
-            style='''
-                position: sticky;
-                bottom: 0;
-                background: white;
-                padding: 15px;
-                border-top: 1px solid #ddd;
-                box-shadow: 0 -2px 12px rgba(0,0,0,0.05);
-            '''
+async def get(req):
+    # The same bytes for everyone; each shopper's chat and cart come from /session
+    return shell.response(req)
+
+
+@rt('/session')
+async def hydrate(session):
+    """This shopper's transcript and cart, loaded into the page shell"""
+    async with store.session(session_id(session)) as state:
+        return Safe(to_xml(session_view(state.messages, state.cart)))
+
+
+class ActionFailed(Exception):
+    """An operation couldn't be applied, so the whole action is rolled back"""
+
+
+class AmbiguousItem(ActionFailed):
+    """An item name could mean more than one cart line (or only loosely matches one), so we ask"""
+
+
+def catalog_name(name: str) -> str:
+    """The catalog's spelling of a product name, if there is a catalog and a confident match"""
+    return catalog_match(name) or name
+
+
+def find_line(cart: Cart, name: str):
+    """The cart line name refers to; raises ActionFailed if none does, AmbiguousItem if unsure"""
+    found = cart.match(name)
+    if not found:
+        raise ActionFailed(f"{name} not found in cart")
+    options = [line.key for line in found.values + found.alternatives]
+    if found.ambiguous and len(options) > 1:
+        raise AmbiguousItem(f"Which {name} do you mean: {', '.join(options[:-1])} or {options[-1]}?")
+    # Ambiguous with nothing else to offer (other names only share the words): just confirm
+    if found.ambiguous or found.confidence < MATCH_CONFIDENCE:
+        raise AmbiguousItem(f"Did you mean {found.values[0].key}?")
+    return found.values[0]
+
+
+def apply_operation(cart: Cart, action, changes: dict) -> str:
+    """Apply one action to the cart, raising ActionFailed if it can't be; returns the chat message"""
+    if isinstance(action, AddAction):
+        added_items = []
+
+        for item in action.items:
+            color = item.color
+            if not color or not color.strip() or color.strip() == '#':
+                color = agent.generate_color_from_title(item.name)
+
+            name = catalog_name(item.name)
+            existing = cart.get(make_key(name, item.attributes))
+            line = cart.add(name, item.quantity, color=color, attributes=item.attributes)
+            changes.setdefault(line.key, existing is not None)
+
+            added_items.append(f"{item.quantity} {line.key}")
+
+        return f"Added {', '.join(added_items)} to cart"
+
+    if isinstance(action, (RemoveAction, SetQuantityAction)):
+        line = find_line(cart, action.name)
+        changes.setdefault(line.key, True)
+        if isinstance(action, SetQuantityAction):
+            cart.set_quantity(line.key, action.quantity)
+            if line.quantity == 0:
+                return f"Removed {line.key} from cart"
+            return f"Set {line.key} to {line.quantity}"
+
+        cart.remove(line.key, action.quantity)
+        if line.quantity == 0:
+            return f"Removed {line.key} from cart"
+
+        return (
+            f"Removed {action.quantity} {line.key} "
+            f"(Remaining: {line.quantity})"
         )
-    )
 
+    if isinstance(action, BatchAction):
+        return "; ".join(apply_operation(cart, operation, changes) for operation in action.operations)
 
-@rt('/submit')
-async def post(prompt: str):
+    if isinstance(action, CartQuery):
+        return action.answer(cart)
+
+    return action.text
+
+
+def apply_action(cart: Cart, action, changes: dict = None) -> str:
+    """
+    Apply an action (including a whole BatchAction) to the cart in one transaction
+    and return the chat message. A TextReply leaves the cart alone and its text is
+    the message; a CartQuery is answered from the cart. If any operation fails, nothing is changed.
+
+    If changes is given, every cart key touched is recorded in it, mapped to
+    whether the key existed before the first change.
+    """
+    touched = {}
     try:
-        response = await agent.get_response_async(prompt, cart_context=cart)
-
-        chat_message = ""
-        try:
-            cleaned_response = response.strip()
-
-            # Remove markdown code block wrapper
-            if cleaned_response.startswith('```'):
-                lines = cleaned_response.split('\n')
-                cleaned_response = '\n'.join(lines[1:-1]).strip()
-
-            response_data = json.loads(cleaned_response)
-            action = response_data.get('action')
-
-            if action == 'add':
-                items = response_data.get('items', [])
-                added_items = []
-
-                for item in items:
-                    product_name = item.get('name', 'Unknown')
-                    quantity = item.get('quantity', 1)
-                    color = item.get('color', '')
-
-                    if not color or not color.strip() or color.strip() == '#':
-                        color = agent.generate_color_from_title(product_name)
-
-                    attributes = item.get('attributes', '')
-
-                    cart_key = f"{product_name} ({attributes})" if attributes else product_name
-
-                    if cart_key in cart:
-                        cart[cart_key]['quantity'] += quantity
-                    else:
-                        cart[cart_key] = {'quantity': quantity, 'color': color}
-
-                    added_items.append(f"{quantity} {cart_key}")
-
-                chat_message = f"Added {', '.join(added_items)} to cart"
-
-            elif action == 'remove':
-                product_name = response_data.get('name', 'Unknown')
-                remove_quantity = response_data.get('quantity', 0)
-
-                found_key = None
-                for key in cart.keys():
-                    if key.startswith(product_name):
-                        found_key = key
-                        break
-
-                if found_key:
-                    current_quantity = cart[found_key]['quantity']
-
-                    if remove_quantity == 0 or remove_quantity >= current_quantity:
-                        del cart[found_key]
-                        chat_message = f"Removed {found_key} from cart"
-                    else:
-                        cart[found_key]['quantity'] -= remove_quantity
-                        chat_message = (
-                            f"Removed {remove_quantity} {found_key} "
-                            f"(Remaining: {cart[found_key]['quantity']})"
-                        )
-                else:
-                    chat_message = f"{product_name} not found in cart"
-            else:
-                chat_message = response
-
-        except (json.JSONDecodeError, TypeError):
-            chat_message = response
-
-        messages.append((prompt, chat_message))
-
-        # CHAT BUBBLES
-        chat_display = []
-        for user_msg, bot_msg in messages:
-            # RIGHT (User)
-            chat_display.append(
-                Div(
-                    Div(
-                        user_msg,
-                        style='''
-                            display:inline-block;
-                            padding: 12px 18px;
-                            background:#0078ff;
-                            color:white;
-                            border-radius:18px 18px 4px 18px;
-                            max-width:70%;
-                            line-height:1.4;
-                        '''
-                    ),
-                    style='text-align:right; margin-bottom:10px;'
-                )
-            )
-
-            # LEFT (Bot)
-            chat_display.append(
-                Div(
-                    Div(
-                        bot_msg,
-                        style='''
-                            display:inline-block;
-                            padding: 12px 18px;
-                            background:#ececec;
-                            color:#111;
-                            border-radius:18px 18px 18px 4px;
-                            max-width:70%;
-                            line-height:1.4;
-                        '''
-                    ),
-                    style='text-align:left; margin-bottom:15px;'
-                )
-            )
-
-        # CART UI
-        cart_display = []
-        for product_name, item_data in cart.items():
-            quantity = item_data['quantity']
-            bg_color = item_data['color']
-            text_color = agent.get_text_color(bg_color)
-
-            cart_display.append(
-                Div(
-                    Div(product_name,
-                        style=f'font-weight:600; font-size:18px; margin-bottom:6px; color:{text_color}'),
-                    Div(f'Quantity: {quantity}',
-                        style=f'font-size:15px; opacity:0.8; color:{text_color}'),
-                    style=f'''
-                        margin-bottom: 12px;
-                        padding: 16px;
-                        border-radius: 12px;
-                        background-color: {bg_color};
-                        box-shadow: 0 3px 8px rgba(0,0,0,0.15);
-                        transition: transform 0.2s;
-                    ''',
-                    onmouseover="this.style.transform='scale(1.02)'",
-                    onmouseout="this.style.transform='scale(1)'"
-                )
-            )
-
-        return Div(
-            Div(*chat_display),
-            Div(*cart_display, id='cart-result', hx_swap_oob='true')
+        with cart.transaction():
+            message = apply_operation(cart, action, touched)
+    except ActionFailed as e:
+        if isinstance(action, BatchAction) and len(action.operations) > 1:
+            if isinstance(e, AmbiguousItem):
+                return f"Nothing was changed yet. {e}"
+            return f"{e}, so nothing was changed"
+        return str(e)
+
+    if changes is not None:
+        for key, existed in touched.items():
+            changes.setdefault(key, existed)
+    return message
+
+
+def is_cacheable(action) -> bool:
+    """Only cart changes are safe to reuse for another prompt or shopper"""
+    return isinstance(action, (AddAction, RemoveAction, SetQuantityAction, BatchAction))
+
+
+def finish_turn(state, prompt: str, action):
+    """Apply the turn's action and record it; returns (chat_message, changes)"""
+    changes = {}
+    chat_message = apply_action(state.cart, action, changes)
+    state.messages.append((prompt, chat_message))
+    return chat_message, changes
+
+
+def render_turn(state, turn, chat_message: str, changes: dict):
+    """
+    The response for a finished turn: what /submit returns, or the payload of the
+    'done' event. Rendered to HTML here, so the 'render' stage covers serializing too.
+    """
+    cart = state.cart
+    if turn.stream:
+        content = (chat_message, *cart_updates(cart, changes))
+    elif INCREMENTAL_RENDER:
+        # Only the new bubble pair, plus out-of-band updates for the cart cards that changed
+        content = (*chat_bubbles(turn.prompt, chat_message), *cart_updates(cart, changes))
+    else:
+        content = session_view(state.messages, cart)
+    return Safe(to_xml(content))
+
+
+async def ask_agent(state, turns, looked_up: bool = False):
+    """
+    Get the actions for turns that need the agent, in a single call however many
+    there are. looked_up means the turns' prompts were already looked up in the cache.
+    """
+    if len(turns) > 1:
+        actions = await agent.get_batch_response_async(
+            [turn.prompt for turn in turns], cart_context=state.cart, history=state,
         )
+        for turn, action in zip(turns, actions):
+            turn.action = action
+            if is_cacheable(action):
+                action_cache.put(turn.prompt, action)
+        return
+
+    if not turns:
+        return
+    turn = turns[0]
+
+    async def fetch():
+        if not turn.stream:
+            output = await agent.get_response_async(turn.prompt, cart_context=state.cart, history=state)
+            return (output if is_cacheable(output) else None), output
+        # Only text replies are worth showing as they arrive; add/remove actions
+        # are applied once they're complete (and only those are shared with
+        # identical prompts waiting on this call)
+        shown = 0
+        async for output in agent.stream_response_async(turn.prompt, cart_context=state.cart, history=state):
+            if isinstance(output, TextReply) and len(output.text) > shown:
+                turn.send_chunk(output.text[shown:])
+                shown = len(output.text)
+        return (output if is_cacheable(output) else None), output
+
+    # Streamed turns were looked up when they were submitted
+    cached, output = await action_cache.get_or_fetch(turn.prompt, fetch, looked_up=looked_up or turn.stream)
+    turn.action = cached or output
+
+
+async def process_turns(sid: str, turns):
+    """
+    Run one batch of a shopper's turns (see TurnQueue) with their state locked.
+
+    Turns are applied in order. Each run of consecutive turns that need the agent
+    costs one agent call, made after the turns before it were applied so the agent
+    sees the cart as it is by then. If an agent call fails, the turns applied before
+    it are saved and answered as usual; that group and every turn after it fail.
+    """
+    results = []
+    failed = None
+    started = time.perf_counter()
+    for turn in turns:
+        STAGE_SECONDS.observe(started - turn.queued_at, stage='queue')
+    if len(turns) > 1:
+        # A cache hit splits the run of agent turns around it, so it's applied before
+        # the agent sees the turns after it
+        for turn in turns:
+            if turn.action is None and not turn.stream:
+                with timed('cache'):
+                    turn.action = action_cache.lookup(turn.prompt)
+
+    async with store.session(sid) as state:
+        for needs_agent, group in groupby(turns, key=lambda turn: turn.action is None):
+            group = list(group)
+            if needs_agent:
+                try:
+                    await ask_agent(state, group, looked_up=len(turns) > 1)
+                except Exception as e:
+                    failed = e
+                    break
+            for turn in group:
+                with timed('cart'):
+                    chat_message, changes = finish_turn(state, turn.prompt, turn.action)
+                with timed('render'):
+                    results.append(render_turn(state, turn, chat_message, changes))
+
+    # Only answer once the state has been saved
+    for turn, result in zip(turns, results):
+        turn.finish(result)
+    for turn in turns[len(results):]:
+        turn.fail(failed)
+
+
+# Each shopper's messages are applied one batch at a time, in order
+turn_queue = TurnQueue(process_turns)
+
+
+def unavailable(prompt: str, message: str, status_code: int):
+    """A 503/504 reply that still shows up in the chat, telling the shopper to retry"""
+    content = ''.join(to_xml(ft) for ft in (user_bubble(prompt), bot_bubble(message, cls='error')))
+    return HTMLResponse(content, status_code=status_code, headers={'Retry-After': '2'})
+
 
+@rt('/submit')
+async def post(prompt: str, session):
+    with timed('submit'):
+        return await submit_prompt(session_id(session), prompt)
+
+
+async def submit_prompt(sid: str, prompt: str):
+    try:
+        # Simple add/remove commands and cart questions are handled locally; everything
+        # else goes to the action cache and, on a miss, to the LLM
+        with timed('fast_path'):
+            action = fast_path.parse(prompt) or cart_queries.parse(prompt)
+        if action is None and STREAM_RESPONSES and INCREMENTAL_RENDER:
+            with timed('cache'):
+                action = action_cache.lookup(prompt)
+            if action is None:
+                if agent.scheduler.saturated:
+                    return unavailable(prompt, BUSY_MESSAGE, 503)
+                # Let the browser pick the reply up token by token from /stream
+                turn_id = uuid.uuid4().hex
+                await store.add_pending(sid, turn_id, prompt)
+                return streaming_bubbles(prompt, turn_id)
+
+        return await turn_queue.submit(sid, Turn(prompt, action)).result
+
+    except Overloaded:
+        return unavailable(prompt, BUSY_MESSAGE, 503)
+    except DeadlineExceeded:
+        return unavailable(prompt, SLOW_MESSAGE, 504)
     except Exception as e:
-        return Div(f"Error: {str(e)}", style='color:red; padding:10px;')
+        return Div(f"Error: {str(e)}", cls='error')
 
 
-serve(port=8001)
+async def stream_turn(sid: str, turn_id: str):
+    """Server-sent events for one streamed reply: text 'chunk's, then a final 'done'"""
+    prompt = await store.pop_pending(sid, turn_id)
+    if prompt is None:
+        yield sse_message("This message has expired, please send it again.", event='done')
+        return
+
+    # The turn is recorded even if the browser goes away before the end
+    turn = turn_queue.submit(sid, Turn(prompt, stream=True))
+    async for text in turn.chunks():
+        yield sse_message(Span(text), event='chunk')
+    try:
+        done = await turn.result
+    except Overloaded:
+        done = Span(BUSY_MESSAGE, cls='error')
+    except DeadlineExceeded:
+        done = Span(SLOW_MESSAGE, cls='error')
+    except Exception as e:
+        done = Span(f"Error: {str(e)}", cls='error')
+    yield sse_message(done, event='done')
+
+
+@rt('/stream/{turn_id}')
+async def stream(turn_id: str, session):
+    return EventStream(stream_turn(session_id(session), turn_id))
+
+
+# Counters the app already keeps, read when /metrics is scraped
+for name, help, read in [
+    ('ecom_fast_path_hits_total', "Messages handled by the local parser", lambda: fast_path.hits),
+    ('ecom_fast_path_misses_total', "Messages the local parser passed on", lambda: fast_path.misses),
+    ('ecom_cart_query_hits_total', "Cart questions answered locally", lambda: cart_queries.hits),
+    ('ecom_action_cache_hits_total', "Action cache hits", lambda: action_cache.hits),
+    ('ecom_action_cache_misses_total', "Action cache misses", lambda: action_cache.misses),
+    ('ecom_action_cache_coalesced_total', "Cache misses that waited for an identical in-flight call",
+     lambda: action_cache.coalesced),
+    ('ecom_turn_batches_total', "Batches of turns processed", lambda: turn_queue.batches),
+    ('ecom_turns_coalesced_total', "Turns that joined another turn's batch", lambda: turn_queue.coalesced),
+    ('ecom_history_tokens_saved_total', "Estimated prompt tokens saved by history trimming",
+     lambda: agent.tokens_saved_total),
+    ('ecom_model_calls_shed_total', "Model calls refused because the queue was full", lambda: scheduler.shed),
+    ('ecom_model_timeouts_total', "Model calls that missed their deadline", lambda: scheduler.timeouts),
+    ('ecom_model_retries_total', "Model calls retried after a rate limit", lambda: scheduler.retries),
+    ('ecom_model_hedges_total', "Hedged model calls started", lambda: scheduler.hedges),
+]:
+    REGISTRY.counter_func(name, help, read)
+
+for name, help, read in [
+    ('ecom_turns_waiting', "Turns queued behind their shopper's current batch", lambda: len(turn_queue)),
+    ('ecom_model_calls_active', "Model calls in progress", lambda: scheduler.active),
+    ('ecom_model_calls_waiting', "Model calls waiting for a slot", lambda: scheduler.waiting),
+    ('ecom_model_wait_seconds_p95', "95th percentile wait for a model slot, recent calls",
+     lambda: scheduler.stats()['wait_ms_p95'] / 1000),
+    ('ecom_sessions', "Shopper sessions in the store", lambda: len(store)),
+]:
+    REGISTRY.gauge_func(name, help, read)
+
+
+@rt('/metrics')
+def metrics():
+    # Prometheus text format, for this worker process only
+    return Response(REGISTRY.render(), media_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# Several workers can't share a reloader, so reload is only on for a single process
+if WORKERS > 1:
+    serve(port=8001, workers=WORKERS, reload=False)
+else:
+    serve(port=8001)
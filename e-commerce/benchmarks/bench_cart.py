@@ -0,0 +1,74 @@
+"""
+Microbenchmarks for the Cart class against the old dict-based cart logic.
+
+Usage:
+    python benchmarks/bench_cart.py [lines ...]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cart import Cart
+
+
+# The dict-based logic post() used before Cart, kept here for comparison
+def dict_add(cart, name, quantity, color, attributes):
+    cart_key = f"{name} ({attributes})" if attributes else name
+    if cart_key in cart:
+        cart[cart_key]['quantity'] += quantity
+    else:
+        cart[cart_key] = {'quantity': quantity, 'color': color}
+
+
+def dict_remove(cart, name, quantity):
+    found_key = None
+    for key in cart.keys():
+        if key.startswith(name):
+            found_key = key
+            break
+    if found_key:
+        if quantity == 0 or quantity >= cart[found_key]['quantity']:
+            del cart[found_key]
+        else:
+            cart[found_key]['quantity'] -= quantity
+
+
+def timed(fn, repeat):
+    start = time.perf_counter()
+    for i in range(repeat):
+        fn(i)
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def run(lines: int, ops: int = 2000):
+    names = [f"Product{i}" for i in range(lines)]
+
+    cart = Cart()
+    legacy = {}
+    fill_cart = timed(lambda i: cart.add(names[i], 1, '#ffffff', 'Size M'), lines)
+    fill_dict = timed(lambda i: dict_add(legacy, names[i], 1, '#ffffff', 'Size M'), lines)
+
+    # Merges and removals target the back half of the cart, the worst case for a scan
+    tail = names[lines // 2:]
+    merge_cart = timed(lambda i: cart.add(tail[i % len(tail)], 1, '#ffffff', 'Size M'), ops)
+    merge_dict = timed(lambda i: dict_add(legacy, tail[i % len(tail)], 1, '#ffffff', 'Size M'), ops)
+    remove_cart = timed(lambda i: cart.remove(tail[i % len(tail)], 1), ops)
+    remove_dict = timed(lambda i: dict_remove(legacy, tail[i % len(tail)], 1), ops)
+    total_cart = timed(lambda i: cart.total_quantity, ops)
+    total_dict = timed(lambda i: sum(v['quantity'] for v in legacy.values()), min(ops, 200))
+
+    print(f"\n{lines:,} cart lines (us/op)       dict       Cart    speedup")
+    for label, old, new in (
+        ("add new line", fill_dict, fill_cart),
+        ("merge into line", merge_dict, merge_cart),
+        ("remove by name", remove_dict, remove_cart),
+        ("total quantity", total_dict, total_cart),
+    ):
+        print(f"  {label:<22} {old:>9.2f} {new:>10.2f} {old / new:>9.1f}x")
+
+
+if __name__ == "__main__":
+    for lines in [int(n) for n in sys.argv[1:]] or [1_000, 10_000, 50_000]:
+        run(lines)
@@ -0,0 +1,126 @@
+"""
+Before/after benchmark of /submit payload size and render time: the old inline-styled
+chat bubbles and cart cards against the class-based components.
+
+Renders a full transcript + cart (INCREMENTAL_RENDER = False) and a single incremental
+response for sessions of different lengths.
+
+Usage:
+    python benchmarks/bench_payload.py
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fasthtml.common import Div, to_xml
+from cart import Cart
+from colors import generate_color_from_title
+import components
+
+
+def _legacy_text_color(bg_color):
+    # Unmemoized copy of colors.get_text_color, as it ran before
+    hex_color = bg_color.lstrip('#').strip()
+    r, g, b = int(hex_color[0:2], 16), int(hex_color[2:4], 16), int(hex_color[4:6], 16)
+    return '#000000' if (0.299 * r + 0.587 * g + 0.114 * b) / 255 > 0.5 else '#FFFFFF'
+
+
+# The inline-styled markup app.py emitted before the shared stylesheet
+def legacy_chat_bubbles(user_msg, bot_msg):
+    return (
+        Div(
+            Div(
+                user_msg,
+                style='''
+                    display:inline-block;
+                    padding: 12px 18px;
+                    background:#0078ff;
+                    color:white;
+                    border-radius:18px 18px 4px 18px;
+                    max-width:70%;
+                    line-height:1.4;
+                '''
+            ),
+            style='text-align:right; margin-bottom:10px;'
+        ),
+        Div(
+            Div(
+                bot_msg,
+                style='''
+                    display:inline-block;
+                    padding: 12px 18px;
+                    background:#ececec;
+                    color:#111;
+                    border-radius:18px 18px 18px 4px;
+                    max-width:70%;
+                    line-height:1.4;
+                '''
+            ),
+            style='text-align:left; margin-bottom:15px;'
+        ),
+    )
+
+
+def legacy_cart_card(line):
+    text_color = _legacy_text_color(line.color)
+    return Div(
+        Div(line.key,
+            style=f'font-weight:600; font-size:18px; margin-bottom:6px; color:{text_color}'),
+        Div(f'Quantity: {line.quantity}',
+            style=f'font-size:15px; opacity:0.8; color:{text_color}'),
+        style=f'''
+            margin-bottom: 12px;
+            padding: 16px;
+            border-radius: 12px;
+            background-color: {line.color};
+            box-shadow: 0 3px 8px rgba(0,0,0,0.15);
+            transition: transform 0.2s;
+        ''',
+        onmouseover="this.style.transform='scale(1.02)'",
+        onmouseout="this.style.transform='scale(1)'"
+    )
+
+
+def full_render(messages, cart, bubbles, card):
+    return to_xml(Div(
+        Div(*[b for user_msg, bot_msg in messages for b in bubbles(user_msg, bot_msg)]),
+        Div(*[card(line) for line in cart], id='cart-result', hx_swap_oob='true')
+    ))
+
+
+def measure(fn, repeat=20):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        html = fn()
+    return len(html.encode()), (time.perf_counter() - start) / repeat * 1000
+
+
+def run(turns: int, lines: int):
+    messages = [(f"add {i} apples", f"Added {i} Apples to cart") for i in range(turns)]
+    cart = Cart()
+    for i in range(lines):
+        name = f"Product {i}"
+        cart.add(name, i + 1, color=generate_color_from_title(name))
+    last = next(iter(cart))
+
+    before_full = measure(lambda: full_render(messages, cart, legacy_chat_bubbles, legacy_cart_card))
+    after_full = measure(lambda: full_render(messages, cart, components.chat_bubbles, components.cart_card))
+    before_step = measure(lambda: to_xml((*legacy_chat_bubbles(*messages[-1]), legacy_cart_card(last))), 200)
+    after_step = measure(lambda: to_xml((*components.chat_bubbles(*messages[-1]),
+                                         components.cart_card(last, hx_swap_oob='true'))), 200)
+
+    print(f"\n{turns} turns, {lines} cart lines       bytes (before -> after)        ms (before -> after)")
+    for label, (b_bytes, b_ms), (a_bytes, a_ms) in (
+        ("full response", before_full, after_full),
+        ("one turn", before_step, after_step),
+    ):
+        print(f"  {label:<15} {b_bytes:>10,} -> {a_bytes:>9,} ({b_bytes / a_bytes:4.1f}x)"
+              f"   {b_ms:8.2f} -> {a_ms:7.2f}")
+
+
+if __name__ == "__main__":
+    print(f"Stylesheet: {len(components.STYLESHEET.encode()):,} bytes, fetched once and cached")
+    for turns, lines in ((10, 5), (100, 20), (500, 50)):
+        run(turns, lines)
@@ -0,0 +1,130 @@
+"""
+Benchmark of product-name matching: ProductIndex over a synthetic catalog and
+Cart.match over a large cart.
+
+The catalog is --catalog made-up "Brand Adjective Noun" names (few distinct words,
+so most words are shared by thousands of names - a hard case for a word index).
+Queries are catalog names changed the ways shoppers change them:
+
+    folded      lowercase and pluralized ("sokuho wireless socks")
+    typo        one character replaced ("Sokuho Wireless Sxck")
+    no brand    brand left out, so thousands of names fit ("Wireless Sock")
+    swapped     two letters of the brand swapped ("Sokhuo Wireless Sock")
+
+For each kind it prints lookup latency (us) and how often the match was the right
+name, ambiguous (the shopper would be asked) or missing. "no brand" should come out
+ambiguous, not right.
+
+Usage:
+    python benchmarks/bench_product_index.py [--catalog 100000] [--cart 10000] [--queries 1000]
+"""
+import argparse
+import os
+import random
+import resource
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cart import Cart
+from product_index import ProductIndex
+
+ADJECTIVES = ("red blue green organic fresh large small classic slim wireless leather cotton wool "
+              "vintage premium deluxe mini smart soft hard").split()
+NOUNS = ("apple banana grape shirt t-shirt jacket shoe sneaker lamp chair table phone cable charger "
+         "mug bottle towel pillow blanket sock hat scarf glove watch ring necklace bag wallet backpack tent").split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--catalog', type=int, default=100_000, help="product names in the catalog")
+    parser.add_argument('--cart', type=int, default=10_000, help="lines in the cart")
+    parser.add_argument('--queries', type=int, default=1000, help="queries of each kind")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def make_catalog(size: int, rng: random.Random) -> list:
+    brands = ["".join(rng.choice("bcdfghklmnprstvz") + rng.choice("aeiou") for _ in range(3)).title()
+              for _ in range(max(10, size // 30))]
+    names = set()
+    while len(names) < size:
+        names.add(f"{rng.choice(brands)} {rng.choice(ADJECTIVES).title()} {rng.choice(NOUNS).title()}")
+    return sorted(names)
+
+
+def typo(name: str, rng: random.Random) -> str:
+    i = rng.randrange(len(name))
+    return name[:i] + rng.choice('abcdefghij') + name[i + 1:]
+
+
+QUERIES = {
+    'folded': lambda name, rng: name.lower() + 's',
+    'typo': typo,
+    'no brand': lambda name, rng: name.split(' ', 1)[1],
+    'swapped': lambda name, rng: name[:3] + name[4] + name[3] + name[5:],
+}
+
+
+def measure(resolve, names: list, make_query, rng: random.Random):
+    """Latencies (us, sorted) and right/ambiguous/missing counts of resolve over queries made from names"""
+    latencies = []
+    outcomes = {'right': 0, 'ambiguous': 0, 'missing': 0, 'wrong': 0}
+    for name in names:
+        query = make_query(name, rng)
+        start = time.perf_counter()
+        found = resolve(query)
+        latencies.append((time.perf_counter() - start) * 1e6)
+        if not found:
+            outcomes['missing'] += 1
+        elif found.ambiguous:
+            outcomes['ambiguous'] += 1
+        elif found.values == [name]:
+            outcomes['right'] += 1
+        else:
+            outcomes['wrong'] += 1
+    return sorted(latencies), outcomes
+
+
+def report(title: str, resolve, names: list, queries: int, rng: random.Random):
+    print(f"\n{title}")
+    print(f"  {'query':<10} {'p50 us':>8} {'p99 us':>8} {'max us':>8}   right  ambiguous  missing  wrong")
+    for kind, make_query in QUERIES.items():
+        latencies, outcomes = measure(resolve, rng.sample(names, min(queries, len(names))), make_query, rng)
+        n = len(latencies)
+        print(f"  {kind:<10} {latencies[n // 2]:>8.1f} {latencies[int(n * 0.99)]:>8.1f} {latencies[-1]:>8.1f}"
+              f"   {outcomes['right']:>5} {outcomes['ambiguous']:>10} {outcomes['missing']:>8} {outcomes['wrong']:>6}")
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    catalog = make_catalog(args.catalog, rng)
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    index = ProductIndex(catalog)
+    index.build()
+    built = time.perf_counter() - start
+    grown = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024
+    print(f"catalog: {len(index):,} names indexed in {built:.2f}s, ~{grown:.0f} MB")
+    report(f"ProductIndex.resolve, {len(index):,} catalog names", index.resolve, catalog, args.queries, rng)
+
+    cart = Cart()
+    lines = rng.sample(catalog, min(args.cart, len(catalog)))
+    for name in lines:
+        cart.add(name)
+    cart.match('warm up the word index')
+    by_key = lambda query: _keys(cart.match(query))
+    report(f"Cart.match, {len(cart):,} cart lines", by_key, lines, args.queries, rng)
+
+
+def _keys(found):
+    # Cart.match returns lines; compare them by key like the catalog's names
+    found.values = [line.key for line in found.values]
+    return found
+
+
+if __name__ == '__main__':
+    main()
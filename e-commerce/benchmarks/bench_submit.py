@@ -0,0 +1,176 @@
+"""
+Load test for POST /submit with a stubbed model, reported as JSON.
+
+Boots the app in-process (see stub_app.py: Gemini is replaced by a deterministic
+function model with --latency seconds of simulated delay) and drives it through
+httpx's ASGI transport, so the numbers are the app's own overhead plus the
+simulated model time, with no network in between.
+
+Each simulated shopper starts with --cart-size products in the cart and
+--history turns of conversation, then sends --requests messages, --concurrency
+shoppers at a time. --fast-path is the share of messages simple enough for the
+local parser; the rest go to the (stubbed) agent, each with a unique prompt so
+the action cache doesn't answer them. With --stream, agent replies are streamed
+and a turn is timed until the /stream response is complete.
+
+Output (stdout, or --out FILE) is one JSON object, meant to be diffed between versions:
+latency percentiles in ms, throughput, response bytes, model calls, model scheduler
+stats and peak RSS. Requests shed by the scheduler (503) count as errors.
+
+Usage:
+    python benchmarks/bench_submit.py [--concurrency 16] [--shoppers 64] [--requests 10]
+        [--cart-size 20] [--history 10] [--latency 0.05] [--fast-path 0.3] [--stream]
+        [--state-path sessions.db] [--out result.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import re
+import resource
+import statistics
+import sys
+import time
+
+import httpx
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--concurrency', type=int, default=16, help="shoppers chatting at the same time")
+    parser.add_argument('--shoppers', type=int, default=64)
+    parser.add_argument('--requests', type=int, default=10, help="messages per shopper")
+    parser.add_argument('--cart-size', type=int, default=20, help="products in each cart to start with")
+    parser.add_argument('--history', type=int, default=10, help="turns of conversation to start with")
+    parser.add_argument('--latency', type=float, default=0.05, help="stub model latency in seconds")
+    parser.add_argument('--fast-path', type=float, default=0.3, help="share of messages the local parser handles")
+    parser.add_argument('--stream', action='store_true', help="stream agent replies over /stream")
+    parser.add_argument('--state-path', help="use the SQLite session store at this path")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="write the JSON here instead of stdout")
+    return parser.parse_args()
+
+
+def percentile(values, pct: int) -> float:
+    if len(values) < 2:
+        return values[0] if values else 0.0
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == 'darwin' else 1024)
+
+
+async def seed(appmod, client, sid: str, cart_size: int, history: int):
+    """Give a new shopper a session cookie, a full cart and some conversation"""
+    appmod.store.new_session_id = lambda: sid
+    try:
+        await client.get('/')
+    finally:
+        del appmod.store.new_session_id
+    async with appmod.store.session(sid) as state:
+        for i in range(cart_size):
+            state.cart.add(f"Product {i}", 1 + i % 3, color=appmod.agent.generate_color_from_title(f"Product {i}"))
+        for turn in range(history):
+            prompt = f"Earlier question number {turn} about my order"
+            action = await appmod.agent.get_response_async(prompt, cart_context=state.cart, history=state)
+            appmod.finish_turn(state, prompt, action)
+        state.cart.drain_changes()
+
+
+async def shopper(client, prompts, results: list, stream: bool):
+    for prompt in prompts:
+        start = time.perf_counter()
+        response = await client.post('/submit', data={'prompt': prompt})
+        size = len(response.content)
+        ok = response.status_code == 200 and 'class="error"' not in response.text
+        turn = re.search(r'sse-connect="/stream/(\w+)"', response.text) if stream else None
+        if turn:
+            streamed = await client.get(f'/stream/{turn.group(1)}')
+            size += len(streamed.content)
+            ok = ok and streamed.status_code == 200 and 'class="error"' not in streamed.text
+        results.append((time.perf_counter() - start, size, ok))
+
+
+def make_prompts(rng, shopper_id: int, count: int, fast_path: float):
+    prompts = []
+    for i in range(count):
+        if rng.random() < fast_path:
+            prompts.append(rng.choice([f"add {i % 4 + 1} apples", "remove 1 apples", f"add {i % 3 + 1} pears"]))
+        else:
+            prompts.append(f"Shopper {shopper_id} wants something nice for dinner, idea {i}")
+    return prompts
+
+
+async def main():
+    args = parse_args()
+    if args.state_path:
+        os.environ['ECOM_STATE_PATH'] = args.state_path
+    # Keep the app's start-up chatter out of the JSON on stdout
+    with contextlib.redirect_stdout(sys.stderr):
+        import stub_app
+
+    appmod = sys.modules['app']
+    appmod.STREAM_RESPONSES = args.stream
+    rng = random.Random(args.seed)
+
+    transport = httpx.ASGITransport(app=stub_app.app)
+    clients = [httpx.AsyncClient(transport=transport, base_url='http://bench', headers={'HX-Request': '1'})
+               for _ in range(args.shoppers)]
+
+    # Setting up carts and history isn't part of the measurement
+    stub_app.STUB_LATENCY = 0
+    for n, client in enumerate(clients):
+        await seed(appmod, client, f"bench-{args.seed}-{n}", args.cart_size, args.history)
+    stub_app.STUB_LATENCY = args.latency
+    stub_app.model_calls = 0
+
+    results = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_shopper(n, client):
+        async with semaphore:
+            await shopper(client, make_prompts(rng, n, args.requests, args.fast_path), results, args.stream)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(run_shopper(n, client) for n, client in enumerate(clients)))
+    elapsed = time.perf_counter() - start
+    for client in clients:
+        await client.aclose()
+
+    latencies = sorted(seconds * 1000 for seconds, _, _ in results)
+    sizes = [size for _, size, _ in results]
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'out'},
+        'requests': len(results),
+        'errors': sum(not ok for _, _, ok in results),
+        'duration_s': round(elapsed, 3),
+        'throughput_rps': round(len(results) / elapsed, 2),
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50), 3),
+            'p95': round(percentile(latencies, 95), 3),
+            'p99': round(percentile(latencies, 99), 3),
+            'mean': round(statistics.fmean(latencies), 3),
+            'max': round(latencies[-1], 3),
+        },
+        'response_bytes': {'total': sum(sizes), 'mean': round(statistics.fmean(sizes), 1)},
+        'model_calls': stub_app.model_calls,
+        'fast_path_hit_rate': round(appmod.fast_path.hit_rate, 3),
+        'scheduler': appmod.agent.scheduler.stats(),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    output = json.dumps(report, indent=2)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+"""
+Requests/sec against the app with 1, 2, 4... uvicorn workers sharing the SQLite state store.
+
+Each run starts `uvicorn stub_app:app` (see stub_app.py - the model is a local stub,
+so this measures the app, not Gemini) with a fresh state database, then lets a number
+of simulated shoppers chat as fast as they can for a fixed time. Every shopper has
+its own session cookie and alternates fast-path commands with prompts that go to
+the (stubbed) agent and stream back over /stream.
+
+Usage:
+    python benchmarks/bench_workers.py [--workers 1 2 4] [--shoppers 32] [--seconds 10]
+"""
+import argparse
+import asyncio
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.dirname(HERE)
+
+
+def prompts():
+    # Fast-path commands never reach the model; the others do, unless cached
+    n = 0
+    while True:
+        n += 1
+        yield f"add {n % 5 + 1} apples"
+        yield f"I'd like something to go with lunch number {n}"
+        yield f"remove {n % 3 + 1} apples"
+
+
+async def shopper(base_url: str, stop_at: float, counts: dict):
+    async with httpx.AsyncClient(base_url=base_url, headers={'HX-Request': '1'}, timeout=30) as client:
+        await client.get('/')
+        for prompt in prompts():
+            if time.monotonic() >= stop_at:
+                return
+            response = await client.post('/submit', data={'prompt': prompt})
+            counts['requests'] += 1
+            counts['errors'] += response.status_code != 200 or 'class="error"' in response.text
+            turn = re.search(r'sse-connect="/stream/(\w+)"', response.text)
+            if turn:
+                response = await client.get(f'/stream/{turn.group(1)}')
+                counts['requests'] += 1
+                counts['errors'] += response.status_code != 200 or 'class="error"' in response.text
+
+
+def wait_until_up(base_url: str, server, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError("uvicorn exited before it started serving")
+        try:
+            httpx.get(base_url + '/styles/x', timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError("uvicorn didn't start in time")
+
+
+def run(workers: int, shoppers: int, seconds: float, port: int, latency: float) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, ECOM_STATE_PATH=os.path.join(tmp, 'sessions.db'), STUB_LATENCY=str(latency))
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'uvicorn', 'stub_app:app', '--app-dir', HERE,
+             '--port', str(port), '--workers', str(workers), '--log-level', 'warning'],
+            cwd=APP_DIR, env=env,
+        )
+        try:
+            base_url = f'http://127.0.0.1:{port}'
+            wait_until_up(base_url, server)
+            counts = {'requests': 0, 'errors': 0}
+
+            async def drive():
+                stop_at = time.monotonic() + seconds
+                await asyncio.gather(*(shopper(base_url, stop_at, counts) for _ in range(shoppers)))
+
+            start = time.perf_counter()
+            asyncio.run(drive())
+            elapsed = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    return {'workers': workers, 'rps': counts['requests'] / elapsed, **counts}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--shoppers', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=10)
+    parser.add_argument('--latency', type=float, default=0.05, help="stub model latency in seconds")
+    parser.add_argument('--port', type=int, default=8011)
+    args = parser.parse_args()
+
+    print(f"{args.shoppers} shoppers, {args.seconds:g}s per run, stub latency {args.latency * 1000:g}ms, "
+          f"{os.cpu_count()} CPUs")
+    print(f"{'workers':>8} {'req/s':>10} {'requests':>10} {'errors':>8} {'scaling':>8}")
+    baseline = None
+    for workers in args.workers:
+        result = run(workers, args.shoppers, args.seconds, args.port, args.latency)
+        baseline = baseline or result['rps']
+        print(f"{workers:>8} {result['rps']:>10.1f} {result['requests']:>10} {result['errors']:>8} "
+              f"{result['rps'] / baseline:>7.2f}x")
+
+
+if __name__ == '__main__':
+    main()
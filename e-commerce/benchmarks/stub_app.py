@@ -0,0 +1,76 @@
+"""
+The e-commerce app with the Gemini model swapped for a local stub, for load benchmarks.
+
+The stub waits STUB_LATENCY seconds (default 0.05) and then adds one product to the
+cart (one per message for a batched call), streaming the tool call in small pieces
+like a real model would. Serve it with
+uvicorn from the e-commerce directory:
+
+    uvicorn stub_app:app --app-dir benchmarks --workers 4
+"""
+import asyncio
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# No Logfire account or Google API key needed for a stubbed model
+os.environ.setdefault("LOGFIRE_SEND_TO_LOGFIRE", "false")
+os.environ.setdefault("LOGFIRE_CONSOLE", "false")
+os.environ.setdefault("GOOGLE_API_KEY", "AIza-benchmark-stub")
+
+import pydantic_ai.models
+from pydantic_ai.messages import ModelResponse, ToolCallPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, FunctionModel
+
+# Seconds each model call takes; can be changed at runtime when imported in-process
+STUB_LATENCY = float(os.getenv("STUB_LATENCY", "0.05"))
+
+# Number of model calls made so far
+model_calls = 0
+
+
+ADD_KIWI = {'items': [{'name': 'Kiwi', 'quantity': 1, 'color': '#8EE53F', 'attributes': ''}]}
+
+
+def _add_call(messages, info: AgentInfo):
+    tool = info.output_tools[0]
+    if 'replies' in tool.parameters_json_schema.get('properties', {}):
+        # Agent.get_batch_response_async: one reply per numbered message
+        prompt = messages[-1].parts[-1].content
+        count = sum(1 for line in prompt.splitlines() if line[:1].isdigit())
+        return tool.name, json.dumps({'replies': [{'action': 'add', **ADD_KIWI}] * count})
+    tool = next(t.name for t in info.output_tools if 'AddAction' in t.name)
+    return tool, json.dumps(ADD_KIWI)
+
+
+async def stub_reply(messages, info: AgentInfo) -> ModelResponse:
+    global model_calls
+    model_calls += 1
+    await asyncio.sleep(STUB_LATENCY)
+    tool, args = _add_call(messages, info)
+    return ModelResponse(parts=[ToolCallPart(tool, args)])
+
+
+async def stub_stream(messages, info: AgentInfo):
+    global model_calls
+    model_calls += 1
+    await asyncio.sleep(STUB_LATENCY)
+    tool, args = _add_call(messages, info)
+    for start in range(0, len(args), 16):
+        yield {0: DeltaToolCall(name=tool if start == 0 else None, json_args=args[start:start + 16])}
+
+
+_infer_model = pydantic_ai.models.infer_model
+
+
+def _stub_model(model, *args, **kwargs):
+    if isinstance(model, str):
+        return FunctionModel(stub_reply, stream_function=stub_stream)
+    return _infer_model(model, *args, **kwargs)
+
+
+pydantic_ai.models.infer_model = _stub_model
+
+from app import app  # noqa: E402
@@ -0,0 +1,281 @@
+from contextlib import contextmanager
+from product_index import Match, ProductIndex, fold
+
+
+def normalize_name(name: str) -> str:
+    """Case- and whitespace-insensitive form of a product name or cart key"""
+    return ' '.join(name.lower().split())
+
+
+def make_key(name: str, attributes: str = '') -> str:
+    """Display key for a cart line, e.g. "Shirt (Red, Size M)" """
+    return f"{name} ({attributes})" if attributes else name
+
+
+class LineItem:
+    """One line in the cart"""
+
+    __slots__ = ('key', 'name', 'attributes', 'quantity', 'color', 'seq')
+
+    def __init__(self, key: str, name: str, attributes: str, quantity: int, color: str, seq: int = 0):
+        self.key = key
+        self.name = name
+        self.attributes = attributes
+        self.quantity = quantity
+        self.color = color
+        # Insertion order, so a rolled-back transaction can put lines back in place
+        self.seq = seq
+
+    def __repr__(self):
+        return f"LineItem({self.key!r}, quantity={self.quantity}, color={self.color!r})"
+
+
+class Cart:
+    """
+    Shopping cart with O(1) add, merge and remove.
+
+    Lines are kept in insertion order (the order they are shown in), keyed by
+    their normalized display key. A second index maps each normalized product
+    name to its variants, so "remove pant" finds "Pant (White)" without scanning
+    the cart and without matching "Pants (Blue)". Total quantity is maintained
+    incrementally.
+
+    Names that only differ in plurals, hyphens or spacing ("Apple"/"Apples",
+    "T-shirt"/"Tshirt") are the same product: adding one merges into the other's
+    line. match() also finds misspelled names through a ProductIndex of the
+    cart's product names, with a confidence.
+
+    Changes made inside `with cart.transaction():` are rolled back if the block
+    raises, using an undo journal of the lines it touched.
+
+    Net quantity changes per line are accumulated until drain_changes() is
+    called, so callers can describe what changed since they last looked
+    (peek_changes() shows them without starting over).
+    """
+
+    def __init__(self):
+        self._lines = {}
+        self._variants = {}
+        self._folded_keys = {}
+        self._names = ProductIndex()
+        self.total_quantity = 0
+        self._seq = 0
+        self._journal = None
+        self._deltas = {}
+
+    @property
+    def distinct_count(self) -> int:
+        return len(self._lines)
+
+    def __len__(self) -> int:
+        return len(self._lines)
+
+    def __iter__(self):
+        return iter(self._lines.values())
+
+    def __contains__(self, key: str) -> bool:
+        return normalize_name(key) in self._lines
+
+    def get(self, key: str):
+        """Line with this display key (ignoring case, plurals and punctuation), or None"""
+        line = self._lines.get(normalize_name(key))
+        if line is None:
+            norm_key = self._folded_keys.get(fold(key))
+            line = self._lines[norm_key] if norm_key is not None else None
+        return line
+
+    def find(self, name: str):
+        """The line match() thinks is meant (the first variant if several are), or None"""
+        found = self.match(name)
+        return found.values[0] if found else None
+
+    def match(self, name: str, min_score: float = 0.6, margin: float = 0.08) -> Match:
+        """
+        Lines a shopper most likely means by name, with a confidence between 0 and 1.
+
+        A key or product name as written (ignoring case), then the same folded (see
+        product_index.fold), matches with confidence 1; anything else is a fuzzy match
+        of the product name (see ProductIndex.resolve). The match is ambiguous - ask
+        which one - if the product has several variants or a runner-up scores too
+        close to call.
+        """
+        norm = normalize_name(name)
+        variants = self._variants.get(norm)
+        line = self._lines.get(norm) or (None if variants else self.get(name))
+        if line is not None:
+            return Match([line], 1.0)
+        found = Match(list(variants), 1.0) if variants else self._names.resolve(name, min_score, margin)
+        lines = [self._lines[key] for key in found.values]
+        return Match(lines, found.confidence, found.ambiguous or len(lines) > 1,
+                     [self._lines[key] for key in found.alternatives])
+
+    def lines_for(self, name: str) -> list:
+        """Every variant of a product name (as written or folded), else the line with that key, else []"""
+        variants = self._variants.get(normalize_name(name)) or self._names.lookup(name)
+        if variants:
+            return [self._lines[key] for key in variants]
+        line = self.get(name)
+        return [line] if line is not None else []
+
+    def add(self, name: str, quantity: int = 1, color: str = '', attributes: str = '') -> LineItem:
+        """Add quantity of a product, merging into an existing line with the same (folded) key"""
+        key = make_key(name, attributes)
+        norm_key = normalize_name(key)
+        line = self._lines.get(norm_key)
+        if line is None:
+            norm_key = self._folded_keys.get(fold(key), norm_key)
+            line = self._lines.get(norm_key)
+        if line is None:
+            self._seq += 1
+            line = LineItem(key, name, attributes, 0, color, self._seq)
+            self._remember(norm_key, line)
+            self._insert(norm_key, line)
+        else:
+            self._remember(norm_key, line)
+        line.quantity += quantity
+        self.total_quantity += quantity
+        self._track(norm_key, line, quantity)
+        return line
+
+    def remove(self, name: str, quantity: int = 0):
+        """
+        Remove quantity of the line matching name (0 or more than in the cart removes the line).
+
+        Returns the affected LineItem (quantity 0 if it was removed), or None if nothing matched.
+        """
+        line = self.find(name)
+        if line is None:
+            return None
+        norm_key = normalize_name(line.key)
+        self._remember(norm_key, line)
+        before = line.quantity
+        if quantity == 0 or quantity >= line.quantity:
+            self._drop(line)
+        else:
+            line.quantity -= quantity
+            self.total_quantity -= quantity
+        self._track(norm_key, line, line.quantity - before)
+        return line
+
+    def set_quantity(self, name: str, quantity: int):
+        """Set the quantity of the line matching name (0 removes it); returns it or None"""
+        line = self.find(name)
+        if line is None:
+            return None
+        norm_key = normalize_name(line.key)
+        self._remember(norm_key, line)
+        before = line.quantity
+        if quantity <= 0:
+            self._drop(line)
+        else:
+            self.total_quantity += quantity - line.quantity
+            line.quantity = quantity
+        self._track(norm_key, line, line.quantity - before)
+        return line
+
+    @contextmanager
+    def transaction(self):
+        """Apply every change in the block, or none of them if it raises"""
+        if self._journal is not None:
+            # Already inside a transaction - the outer one owns the journal
+            yield self
+            return
+        self._journal = {}
+        try:
+            yield self
+        except BaseException:
+            self._rollback()
+            raise
+        finally:
+            self._journal = None
+
+    def peek_changes(self) -> list:
+        """Net (line, quantity change) pairs since the last drain_changes(), leaving them pending"""
+        return [(line, delta) for line, delta in self._deltas.values() if delta]
+
+    def drain_changes(self) -> list:
+        """Net (line, quantity change) pairs since the last call, then start over"""
+        changes = self.peek_changes()
+        self._deltas = {}
+        return changes
+
+    def to_dict(self) -> dict:
+        """Plain-data form of the cart (lines and pending changes), for storing it outside the process"""
+        def fields(line):
+            return [line.key, line.name, line.attributes, line.quantity, line.color, line.seq]
+        return {
+            'lines': [fields(line) for line in self._lines.values()],
+            'seq': self._seq,
+            'changes': [[*fields(line), delta] for line, delta in self._deltas.values()],
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'Cart':
+        """Rebuild a cart saved with to_dict()"""
+        cart = cls()
+        for fields in data['lines']:
+            line = LineItem(*fields)
+            cart._insert(normalize_name(line.key), line)
+            cart.total_quantity += line.quantity
+        cart._seq = data['seq']
+        for *fields, delta in data['changes']:
+            norm_key = normalize_name(fields[0])
+            # Lines removed since the last drain aren't in the cart any more
+            line = cart._lines.get(norm_key) or LineItem(*fields)
+            cart._deltas[norm_key] = (line, delta)
+        return cart
+
+    def clear(self):
+        self._lines.clear()
+        self._variants.clear()
+        self._folded_keys.clear()
+        self._names = ProductIndex()
+        self._deltas = {}
+        self.total_quantity = 0
+
+    def _track(self, norm_key: str, line: LineItem, delta: int):
+        _, total = self._deltas.get(norm_key, (line, 0))
+        self._deltas[norm_key] = (line, total + delta)
+
+    def _insert(self, norm_key: str, line: LineItem):
+        self._lines[norm_key] = line
+        self._variants.setdefault(normalize_name(line.name), {})[norm_key] = None
+        self._folded_keys.setdefault(fold(line.key), norm_key)
+        self._names.add(line.name, norm_key)
+
+    def _remember(self, norm_key: str, line: LineItem):
+        # First touch only: the journal holds each line's state from before the transaction
+        if self._journal is not None and norm_key not in self._journal:
+            existed = norm_key in self._lines
+            self._journal[norm_key] = (line, line.quantity if existed else 0, existed)
+
+    def _rollback(self):
+        reinserted = False
+        for norm_key, (line, quantity, existed) in self._journal.items():
+            # Not necessarily the journaled line: one removed and added again is a new LineItem
+            current = self._lines.get(norm_key)
+            self._track(norm_key, line, quantity - (current.quantity if current is not None else 0))
+            if current is not None:
+                self._drop(current)
+            if existed:
+                line.quantity = quantity
+                self.total_quantity += quantity
+                self._insert(norm_key, line)
+                reinserted = True
+        if reinserted:
+            # Restore display order for lines that were dropped and put back
+            self._lines = dict(sorted(self._lines.items(), key=lambda item: item[1].seq))
+
+    def _drop(self, line: LineItem):
+        norm_key = normalize_name(line.key)
+        del self._lines[norm_key]
+        norm_name = normalize_name(line.name)
+        variants = self._variants[norm_name]
+        del variants[norm_key]
+        if not variants:
+            del self._variants[norm_name]
+        if self._folded_keys.get(fold(line.key)) == norm_key:
+            del self._folded_keys[fold(line.key)]
+        self._names.discard(line.name, norm_key)
+        self.total_quantity -= line.quantity
+        line.quantity = 0
@@ -0,0 +1,196 @@
+from functools import lru_cache
+import re
+from metrics import hit_rate
+
+# Questions about the cart that can be answered from the cart itself, without the LLM.
+# Patterns are deliberately narrow: anything they don't fully match goes to the agent.
+
+_CART = r"(?:(?:in|on) (?:my|the) (?:cart|basket|bag)|in there|in it)"
+_HAVE = r"(?:do i have|have i got|are there|is there|did i add|have i added|i have|are)"
+_ITEMS = r"(?:items|things|products|units)"
+_NAME = r"(?P<name>[a-z][a-z'-]*(?: [a-z][a-z'-]*){0,2}?)"
+_ATTR = r"(?P<attr>(?:size )?[a-z0-9]+)"
+
+_PATTERNS = [
+    ('empty', rf"is (?:my|the) (?:cart|basket|bag) empty"),
+    ('total', rf"how many {_ITEMS}(?: {_HAVE})?(?: {_CART})?(?: in total| total| altogether| overall)?"),
+    ('total', rf"(?:what is )?(?:the )?(?:total (?:number of )?(?:items|quantity|count)|number of items|item count)"
+              rf"(?: {_CART})?"),
+    ('distinct', rf"how many (?:different|distinct|unique) (?:items|things|products|kinds|types)(?: of {_ITEMS})?"
+                 rf"(?: {_HAVE})?(?: {_CART})?"),
+    ('list', rf"what is {_CART}"),
+    ('list', rf"what(?: {_ITEMS})? (?:do i have|have i got|are there|did i add|have i added)(?: {_CART})?"),
+    ('list', rf"(?:show|list|view)(?: me)?(?: (?:my|the))? (?:cart|basket|bag|{_ITEMS})(?: {_CART})?"),
+    ('list', rf"(?:my )?cart contents"),
+    ('filter', rf"(?:what|which|show(?: me)?|list)(?: (?:the|my|all))? {_ATTR} {_ITEMS}"
+               rf"(?: (?:do i have|have i got|are there|are))?(?: {_CART})?"),
+    ('filter_count', rf"how many {_ATTR} {_ITEMS}(?: {_HAVE})?(?: {_CART})?"),
+    ('count', rf"how many {_NAME}(?: {_HAVE})?(?: {_CART})?"),
+    ('has', rf"(?:do i have|have i got|is there|are there|did i add|have i added)(?: any)? {_NAME}(?: {_CART})?"),
+    ('has', rf"(?:is|are) (?:there )?(?:any )?{_NAME} {_CART}"),
+]
+_COMPILED = [(kind, re.compile(pattern)) for kind, pattern in _PATTERNS]
+
+# Words that can't be a product or attribute name - such questions go to the agent
+_NOT_NAMES = {
+    'items', 'things', 'products', 'units', 'different', 'distinct', 'unique', 'kinds', 'types',
+    'of', 'the', 'my', 'in', 'it', 'there', 'cart', 'left', 'more', 'less', 'much', 'times', 'people',
+    'calories', 'days', 'should', 'can', 'could', 'would', 'will', 'you', 'we', 'they',
+    'do', 'does', 'did', 'i', 'have', 'got', 'is', 'are',
+}
+
+# Basic color names and a representative RGB, for matching "red items" against line colors
+_PALETTE = {
+    'red': (220, 20, 60), 'orange': (255, 140, 0), 'yellow': (255, 225, 53), 'green': (50, 160, 50),
+    'blue': (40, 90, 220), 'purple': (128, 0, 128), 'pink': (252, 110, 160), 'brown': (139, 90, 43),
+    'black': (20, 20, 20), 'white': (250, 250, 245), 'grey': (128, 128, 128),
+}
+_COLOR_ALIASES = {'gray': 'grey', 'violet': 'purple'}
+
+# Longest list we spell out in a chat reply
+_MAX_LISTED = 20
+
+
+@lru_cache(maxsize=4096)
+def color_name(hex_color: str) -> str:
+    """Nearest basic color name for a hex color, or '' if it isn't one"""
+    value = hex_color.lstrip('#').strip()
+    if len(value) != 6:
+        return ''
+    try:
+        rgb = tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        return ''
+    return min(_PALETTE, key=lambda name: sum((a - b) ** 2 for a, b in zip(rgb, _PALETTE[name])))
+
+
+def _quantity(n: int, noun: str = 'item') -> str:
+    return f"{n} {noun}" if n == 1 else f"{n} {noun}s"
+
+
+def _listing(lines) -> str:
+    shown = ", ".join(f"{line.quantity} {line.key}" for line in lines[:_MAX_LISTED])
+    if len(lines) > _MAX_LISTED:
+        shown += f" and {len(lines) - _MAX_LISTED} more"
+    return shown
+
+
+class CartQuery:
+    """A recognized question about the cart, answered from the cart when the turn is applied"""
+
+    __slots__ = ('kind', 'name', 'attribute')
+
+    def __init__(self, kind: str, name: str = '', attribute: str = ''):
+        self.kind = kind
+        self.name = name
+        self.attribute = attribute
+
+    def __repr__(self):
+        return f"CartQuery({self.kind!r}, name={self.name!r}, attribute={self.attribute!r})"
+
+    def answer(self, cart) -> str:
+        if self.kind == 'empty':
+            return "Yes, your cart is empty." if not cart else (
+                f"No, you have {_quantity(cart.total_quantity)} in your cart.")
+
+        if self.kind in ('total', 'distinct', 'list') and not cart:
+            return "Your cart is empty."
+        if self.kind == 'total':
+            return (f"You have {_quantity(cart.total_quantity)} in your cart "
+                    f"({_quantity(cart.distinct_count, 'different product')}).")
+        if self.kind == 'distinct':
+            return f"You have {_quantity(cart.distinct_count, 'different product')} in your cart."
+        if self.kind == 'list':
+            lines = list(cart)
+            return f"Your cart has {_quantity(cart.total_quantity)}: {_listing(lines)}."
+
+        if self.kind in ('filter', 'filter_count'):
+            lines = [line for line in cart if self._has_attribute(line)]
+            label = self.attribute.title() if self.attribute.startswith('size') else self.attribute
+            if not lines:
+                return f"You don't have any {label} items in your cart."
+            total = sum(line.quantity for line in lines)
+            if self.kind == 'filter_count':
+                return f"You have {_quantity(total)} that {'is' if total == 1 else 'are'} {label}: {_listing(lines)}."
+            return f"Your {label} items: {_listing(lines)}."
+
+        # lines_for folds plurals, so "how many apples" finds "Apple"
+        lines = cart.lines_for(self.name)
+        if not lines:
+            return f"You don't have any {self.name.title()} in your cart."
+        total = sum(line.quantity for line in lines)
+        if self.kind == 'has':
+            return f"Yes, you have {_listing(lines)} in your cart."
+        if len(lines) == 1:
+            return f"You have {lines[0].quantity} {lines[0].key} in your cart."
+        return f"You have {total} {self.name.title()} in your cart: {_listing(lines)}."
+
+    def _has_attribute(self, line) -> bool:
+        wanted = self.attribute
+        if wanted.startswith('size '):
+            return f"size {wanted[5:]}" in line.attributes.lower()
+        color = _COLOR_ALIASES.get(wanted, wanted)
+        words = re.findall(r"[a-z0-9]+", line.attributes.lower())
+        if wanted in words or color in words:
+            return True
+        # Products without attributes (e.g. groceries) only have their display color
+        return color in _PALETTE and not line.attributes and color_name(line.color) == color
+
+
+def parse_query(prompt: str, is_known=None):
+    """
+    Return a CartQuery if prompt is a cart question we can answer locally, else None.
+
+    Questions about a product ("how many apples", "do i have any milk") are only
+    taken when is_known recognizes the name as a product, so "do i have free
+    shipping?" goes to the agent. Without is_known any name is taken.
+    """
+    text = ' '.join(prompt.lower().replace("what's", "what is").replace("whats", "what is").split())
+    text = text.strip().rstrip('?.! ')
+    if not text:
+        return None
+    for kind, pattern in _COMPILED:
+        match = pattern.fullmatch(text)
+        if match is None:
+            continue
+        groups = match.groupdict()
+        name = groups.get('name') or ''
+        attribute = groups.get('attr') or ''
+        if name:
+            words = set(name.split())
+            # "red apples" mixes a product with an attribute - the agent handles that better
+            if words & _NOT_NAMES or words & _PALETTE.keys() or words & _COLOR_ALIASES.keys() \
+                    or name.split()[0] in ('a', 'an', 'some'):
+                return None
+            if is_known is not None and not is_known(name):
+                return None
+        if attribute and (attribute in _NOT_NAMES or attribute.isdigit()):
+            return None
+        if kind in ('filter', 'filter_count') and not attribute.startswith('size ') \
+                and _COLOR_ALIASES.get(attribute, attribute) not in _PALETTE:
+            # "what fresh items" - not an attribute we can check, let the agent decide
+            return None
+        return CartQuery(kind, name, attribute)
+    return None
+
+
+class CartQueryParser:
+    """parse_query with hit/miss counters, like FastPathParser"""
+
+    def __init__(self, is_known=None):
+        self.is_known = is_known
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, prompt: str):
+        """Return the CartQuery, or None if the question should go to the LLM"""
+        result = parse_query(prompt, self.is_known)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    @property
+    def hit_rate(self) -> float:
+        return hit_rate(self.hits, self.misses)
@@ -0,0 +1,51 @@
+from functools import lru_cache
+import hashlib
+
+# Both helpers are pure and get called for every cart card on every render,
+# so results are memoized per color / title.
+
+
+@lru_cache(maxsize=4096)
+def generate_color_from_title(title: str) -> str:
+    """Generate a consistent color from a title using hash"""
+    # Generate hash from title
+    hash_object = hashlib.md5(title.encode())
+    hash_hex = hash_object.hexdigest()
+
+    # Use first 6 characters as color, ensure it's not too dark
+    r = int(hash_hex[0:2], 16)
+    g = int(hash_hex[2:4], 16)
+    b = int(hash_hex[4:6], 16)
+
+    # Make colors lighter by ensuring minimum brightness
+    r = max(r, 100)
+    g = max(g, 100)
+    b = max(b, 100)
+
+    return f'#{r:02x}{g:02x}{b:02x}'
+
+
+@lru_cache(maxsize=4096)
+def get_text_color(bg_color: str) -> str:
+    """Determine if text should be white or black based on background color brightness"""
+    try:
+        # Remove # if present and handle empty/invalid colors
+        hex_color = bg_color.lstrip('#').strip()
+
+        # Default to black text if color is invalid
+        if not hex_color or len(hex_color) < 6:
+            return '#000000'
+
+        # Convert to RGB
+        r = int(hex_color[0:2], 16)
+        g = int(hex_color[2:4], 16)
+        b = int(hex_color[4:6], 16)
+
+        # Calculate relative luminance (perceived brightness)
+        luminance = (0.299 * r + 0.587 * g + 0.114 * b) / 255
+
+        # Return black text for light backgrounds, white text for dark backgrounds
+        return '#000000' if luminance > 0.5 else '#FFFFFF'
+    except (ValueError, IndexError):
+        # Default to black text on error
+        return '#000000'
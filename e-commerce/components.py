@@ -0,0 +1,172 @@
+from fasthtml.common import *
+from colors import get_text_color
+from functools import lru_cache
+import hashlib
+
+# All static styling lives here and is served once from STYLESHEET_URL, so chat bubbles
+# and cart cards only carry short class names.
+STYLESHEET = """
+.top-bar { text-align:center; background:#ffffff; box-shadow:0 2px 6px rgba(0,0,0,0.1); margin-bottom:10px; }
+.top-bar h1 { margin:0; padding:18px; font-size:30px; font-weight:700; }
+.layout { display:flex; height:75vh; background:#f0f2f5; border-radius:15px; overflow:hidden; }
+.panel { flex:1; display:flex; flex-direction:column; padding:25px; background:#f7f9fc; }
+.panel.chat { border-right:2px solid #eee; }
+.panel h3 { margin-bottom:15px; font-weight:600; }
+.panel-body { flex:1; overflow-y:auto; padding:20px; border-radius:12px; background:#ffffff;
+  box-shadow:0 4px 12px rgba(0,0,0,0.08); max-height:calc(80vh - 120px); }
+.chat .panel-body { margin-bottom:10px; }
+.prompt-form { position:sticky; bottom:0; background:white; padding:15px; border-top:1px solid #ddd;
+  box-shadow:0 -2px 12px rgba(0,0,0,0.05); }
+.prompt-row { display:flex; align-items:center; }
+.prompt-row input { flex:4; padding:12px 16px; border:1px solid #ccc; border-radius:8px; font-size:16px; background:white; }
+.prompt-row button { flex:1; padding:12px; margin-left:10px; background:#0066ff; color:white; border:none;
+  border-radius:8px; font-size:16px; cursor:pointer; }
+/* chat bubbles: u = user, b = bot */
+.u { text-align:right; margin-bottom:10px; }
+.b { text-align:left; margin-bottom:15px; }
+.u > div, .b > div { display:inline-block; padding:12px 18px; max-width:70%; line-height:1.4; }
+.u > div { background:#0078ff; color:white; border-radius:18px 18px 4px 18px; }
+.b > div { background:#ececec; color:#111; border-radius:18px 18px 18px 4px; }
+.error { color:red; padding:10px; }
+/* cart cards: n = name, q = quantity; colors are set per card */
+.card { margin-bottom:12px; padding:16px; border-radius:12px; box-shadow:0 3px 8px rgba(0,0,0,0.15);
+  transition:transform 0.2s; }
+.card:hover { transform:scale(1.02); }
+.card .n { font-weight:600; font-size:18px; margin-bottom:6px; }
+.card .q { font-size:15px; opacity:0.8; }
+"""
+
+# Versioned URL, so browsers can cache the stylesheet forever. No .css extension,
+# since fast_app's static file route would claim it.
+STYLESHEET_VERSION = hashlib.md5(STYLESHEET.encode()).hexdigest()[:8]
+STYLESHEET_URL = f'/styles/{STYLESHEET_VERSION}'
+
+
+def user_bubble(user_msg):
+    """User message, right-aligned"""
+    return Div(Div(user_msg), cls='u')
+
+
+def bot_bubble(*content, **kwargs):
+    """Bot message, left-aligned; kwargs go on the inner bubble"""
+    return Div(Div(*content, **kwargs), cls='b')
+
+
+def chat_bubbles(user_msg, bot_msg):
+    """The user (right) and bot (left) bubbles for one exchange"""
+    return user_bubble(user_msg), bot_bubble(bot_msg)
+
+
+def streaming_bubbles(user_msg, turn_id: str):
+    """
+    User bubble plus an empty bot bubble that fills itself from /stream/{turn_id}.
+
+    'chunk' events are appended as text arrives; the final 'done' event replaces
+    the bubble's content and carries out-of-band cart updates.
+    """
+    return (
+        user_bubble(user_msg),
+        bot_bubble(
+            Span(sse_swap='chunk', hx_swap='beforeend'),
+            hx_ext='sse',
+            sse_connect=f'/stream/{turn_id}',
+            sse_swap='done',
+            sse_close='done',
+            hx_swap='innerHTML',
+        ),
+    )
+
+
+@lru_cache(maxsize=4096)
+def cart_item_id(cart_key: str) -> str:
+    """Stable DOM id for a cart card, so single cards can be swapped out-of-band"""
+    return 'cart-' + hashlib.md5(cart_key.encode()).hexdigest()[:12]
+
+
+def cart_card(line, **kwargs):
+    """One product card in the cart panel"""
+    return Div(
+        Div(line.key, cls='n'),
+        Div(f'Quantity: {line.quantity}', cls='q'),
+        id=cart_item_id(line.key),
+        cls='card',
+        style=f'background:{line.color};color:{get_text_color(line.color)}',
+        **kwargs
+    )
+
+
+def cart_updates(cart, changes: dict):
+    """
+    Out-of-band swaps for the cart cards touched by this request.
+
+    changes maps each touched cart key to whether it existed before the request.
+    """
+    updates = []
+    for key, existed in changes.items():
+        line = cart.get(key)
+        if line is not None:
+            if existed:
+                updates.append(cart_card(line, hx_swap_oob='true'))
+            else:
+                updates.append(Div(cart_card(line), hx_swap_oob='beforeend:#cart-result'))
+        elif existed:
+            updates.append(Div(id=cart_item_id(key), hx_swap_oob='delete'))
+    return updates
+
+
+def session_view(messages, cart):
+    """The whole transcript, plus the whole cart swapped in out-of-band"""
+    return (
+        *[bubble for user_msg, bot_msg in messages for bubble in chat_bubbles(user_msg, bot_msg)],
+        Div(*[cart_card(line) for line in cart], id='cart-result', cls='panel-body', hx_swap_oob='true'),
+    )
+
+
+def page_layout(swap: str):
+    """
+    The page around the chat: the same for every shopper, so it can be rendered once.
+
+    The chat panel loads the shopper's own transcript and cart from /session when
+    the page is shown. swap is how /submit responses go into the chat.
+    """
+    return (
+        # TOP BAR
+        Div(H1(" E-Commerce Assistant"), cls='top-bar'),
+
+        # MAIN LAYOUT
+        Div(
+            # LEFT: CHAT PANEL
+            Div(
+                H3("Chat"),
+                Div(id='chat-result', cls='panel-body', hx_get='/session', hx_trigger='load'),
+                cls='panel chat'
+            ),
+
+            # RIGHT: CART PANEL
+            Div(
+                H3("Cart"),
+                Div(id='cart-result', cls='panel-body'),
+                cls='panel cart'
+            ),
+
+            cls='layout'
+        ),
+
+        # BOTTOM INPUT AREA
+        Form(
+            Div(
+                Input(
+                    id='prompt', name='prompt',
+                    placeholder='Type a message...',
+                    required=True,
+                ),
+                Button('Send', type='submit'),
+                cls='prompt-row'
+            ),
+            hx_post='/submit',
+            hx_target='#chat-result',
+            hx_swap=swap,
+            **{'hx-on::after-request': 'this.reset()'},
+            cls='prompt-form'
+        ),
+    )
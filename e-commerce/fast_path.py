@@ -0,0 +1,183 @@
+import re
+from metrics import hit_rate
+from models import AddAction, BatchAction, CartItem, RemoveAction
+from product_index import fold
+
+# Number words we accept as quantities ("a" / "an" mean one)
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'eleven': 11,
+    'twelve': 12, 'dozen': 12,
+}
+
+ADD_VERBS = ('add', 'put', 'buy', 'get', 'i want', 'i need', 'give me')
+REMOVE_VERBS = ('remove', 'delete', 'drop', 'take out', 'take away', 'put back')
+# Dropped wherever they appear in a product phrase ("take out all the apples")
+ARTICLES = {'the', 'all', 'a', 'an'}
+
+# Natural colors for common products, keyed by singular lowercase name.
+# Anything missing gets a hash color from Agent.generate_color_from_title.
+PRODUCT_COLORS = {
+    'apple': '#DC143C', 'grape': '#8B4789', 'banana': '#FFE135', 'orange': '#FFA500',
+    'lemon': '#FFF44F', 'lime': '#32CD32', 'strawberry': '#FC5A8D', 'blueberry': '#4F86F7',
+    'cherry': '#DE3163', 'kiwi': '#8EE53F', 'mango': '#FFC324', 'pear': '#D1E231',
+    'peach': '#FFE5B4', 'watermelon': '#FC6C85', 'pineapple': '#FEEA63', 'plum': '#8E4585',
+    'tomato': '#FF6347', 'carrot': '#ED9121', 'potato': '#C4A484', 'onion': '#E6C7A1',
+    'avocado': '#568203', 'broccoli': '#4C8C2B', 'cucumber': '#77A95A', 'lettuce': '#9ACD32',
+    'milk': '#FDFFF5', 'bread': '#DEB887', 'egg': '#F0EAD6', 'cheese': '#FFD700',
+    'butter': '#FFF1A8', 'coffee': '#6F4E37', 'chocolate': '#7B3F00', 'rice': '#FAF9F6',
+}
+
+# Words that mean the input is more than a bare "quantity + product" command:
+# attributes (colors, sizes), questions about the cart, or multi-part phrasing.
+# Those go to the LLM, which handles them properly.
+AMBIGUOUS_WORDS = {
+    'what', 'how', 'why', 'which', 'when', 'where', 'who', 'is', 'are', 'do', 'does',
+    'can', 'could', 'should', 'my', 'cart', 'total', 'items', 'item', 'show', 'list',
+    'clear', 'empty', 'everything', 'with', 'without', 'size', 'of', 'for', 'in', 'from',
+    'to', 'but', 'not', 'no', 'instead', 'more', 'less', 'some', 'few', 'half', 'pair',
+    'red', 'blue', 'green', 'yellow', 'purple', 'pink', 'black', 'white', 'grey', 'gray',
+    'brown', 'small', 'medium', 'large', 'xl', 'xs', 'i', 'me', 'you', 'it', 'this',
+    'that', 'them', 'please', 'thanks', 'hi', 'hello',
+}
+
+_WORD = re.compile(r"[a-z]+(?:[-'][a-z]+)*")
+_MAX_PRODUCT_WORDS = 3
+
+
+def _leading_verb(text: str, verbs) -> tuple:
+    """Strip a leading verb from text, returning (matched, rest)"""
+    for verb in verbs:
+        if text == verb or text.startswith(verb + ' '):
+            return True, text[len(verb):].strip()
+    return False, text
+
+
+def _parse_item(text: str):
+    """Parse "[quantity] product" into (quantity or None, words), or None if not confident"""
+    words = text.split()
+    quantity = None
+    if words and (words[0].isdigit() or words[0] in NUMBER_WORDS):
+        quantity = int(words[0]) if words[0].isdigit() else NUMBER_WORDS[words[0]]
+        words = words[1:]
+    words = [w for w in words if w not in ARTICLES]
+    if not words or len(words) > _MAX_PRODUCT_WORDS:
+        return None
+    if any(not _WORD.fullmatch(w) or w in AMBIGUOUS_WORDS or w in NUMBER_WORDS for w in words):
+        return None
+    return quantity, words
+
+
+def known_product(name: str) -> bool:
+    """Whether name is one of the common products in PRODUCT_COLORS (singular or plural)"""
+    return fold(name) in PRODUCT_COLORS
+
+
+def _parse_clause(clause: str, is_known):
+    """
+    Parse one "[verb] [quantity] product" clause into (verb or None, quantity or None,
+    name), or None unless the product is one is_known recognizes
+    """
+    verb, rest = None, clause
+    # Remove verbs first, so "put back" isn't read as "put"
+    for name, verbs in (('remove', REMOVE_VERBS), ('add', ADD_VERBS)):
+        matched, rest = _leading_verb(clause, verbs)
+        if matched:
+            verb = name
+            break
+    parsed = _parse_item(rest)
+    if parsed is None:
+        return None
+    quantity, words = parsed
+    name = ' '.join(words).title()
+    if not is_known(name):
+        return None
+    return verb, quantity, name
+
+
+def product_color(name: str) -> str:
+    """Natural color for a known product (singular or plural), else empty string"""
+    word = name.lower().split()[-1]
+    for candidate in (word, word[:-1], word[:-2], word[:-3] + 'y'):
+        if candidate in PRODUCT_COLORS:
+            return PRODUCT_COLORS[candidate]
+    return ''
+
+
+def parse_command(prompt: str, is_known=known_product):
+    """
+    Parse simple add/remove commands locally.
+
+    Returns the same AddAction / RemoveAction the agent produces - or a BatchAction
+    for mixed commands like "remove the apples and add 2 pears" - or None when the
+    prompt isn't a command we can parse with confidence. Every product named has to
+    be one is_known recognizes (by default the common products in PRODUCT_COLORS),
+    so "i need help" or "buy now" go to the LLM rather than into the cart.
+    """
+    text = ' '.join(prompt.lower().strip().rstrip('.!').split())
+    if not text or '?' in text:
+        return None
+
+    segments = re.split(r'(\s*,\s*|\s+and\s+|\s+then\s+)', text)
+    clauses = [segments[0]]
+    for separator, segment in zip(segments[1::2], segments[2::2]):
+        joined = f"{clauses[-1]} and {segment}"
+        # "mac and cheese" is one product, not two
+        if separator.strip() == 'and' and _parse_clause(joined, is_known) is not None:
+            clauses[-1] = joined
+        else:
+            clauses.append(segment)
+
+    operations = []
+    verb = None
+    for clause in clauses:
+        parsed = _parse_clause(clause, is_known)
+        if parsed is None:
+            return None
+        # Each clause may start with its own verb; otherwise it continues the last one
+        clause_verb, quantity, name = parsed
+        verb = clause_verb or verb
+        # "add 0 apples" or "remove 0 grapes" (which would remove them all) mean nothing clear
+        if quantity == 0:
+            return None
+
+        if verb == 'remove':
+            operations.append(RemoveAction(name=name, quantity=quantity or 0))
+            continue
+
+        # Without a verb only "<quantity> <product>" is clearly an add
+        if quantity is None and verb is None:
+            return None
+        item = CartItem(name=name, quantity=quantity or 1, color=product_color(name))
+        if operations and isinstance(operations[-1], AddAction):
+            operations[-1].items.append(item)
+        else:
+            operations.append(AddAction(items=[item]))
+
+    if not operations:
+        return None
+    if len(operations) == 1:
+        return operations[0]
+    return BatchAction(operations=operations)
+
+
+class FastPathParser:
+    """parse_command with hit/miss counters, so we can see how much traffic skips the LLM"""
+
+    def __init__(self, is_known=known_product):
+        self.is_known = is_known
+        self.hits = 0
+        self.misses = 0
+
+    def parse(self, prompt: str):
+        """Return the parsed action, or None if the prompt should go to the LLM"""
+        result = parse_command(prompt, self.is_known)
+        if result is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return result
+
+    @property
+    def hit_rate(self) -> float:
+        return hit_rate(self.hits, self.misses)
@@ -0,0 +1,166 @@
+from dataclasses import dataclass, replace
+from pydantic_ai.messages import (
+    ModelRequest, ModelResponse, SystemPromptPart, TextPart, ToolCallPart, UserPromptPart,
+)
+
+SUMMARY_PREFIX = "Summary of the earlier conversation:\n"
+
+# The cart changes note Agent appends to user messages - never worth summarizing
+CART_CHANGES_PREFIX = "\n\n[Cart changes since your last message: "
+
+
+def estimate_tokens(messages) -> int:
+    """Cheap token estimate (~4 characters per token) for a list of model messages"""
+    chars = 0
+    for message in messages:
+        for part in message.parts:
+            content = getattr(part, 'content', None)
+            if content is None:
+                content = getattr(part, 'args', None)
+            if content is not None:
+                chars += len(content) if isinstance(content, str) else len(str(content))
+    return (chars + 3) // 4
+
+
+def _summary_tokens(summary: str) -> int:
+    """estimate_tokens of the system prompt part holding a summary"""
+    return (len(SUMMARY_PREFIX) + len(summary) + 3) // 4
+
+
+def strip_instructions(messages) -> list:
+    """Drop per-run instructions (e.g. the live cart listing) before storing a history"""
+    return [replace(m, instructions=None) if isinstance(m, ModelRequest) and m.instructions else m
+            for m in messages]
+
+
+def split_turns(messages) -> list:
+    """Split a message history into turns, each starting at a user prompt"""
+    turns = []
+    for message in messages:
+        starts_turn = isinstance(message, ModelRequest) and any(
+            isinstance(part, UserPromptPart) for part in message.parts
+        )
+        if starts_turn or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+@dataclass
+class HistoryStats:
+    """
+    What a HistoryPolicy did to one turn's history.
+
+    tokens_before is the whole conversation untrimmed, including turns folded into
+    the summary on earlier turns (tokens_folded counts those, for the next apply).
+    """
+    turns_kept: int = 0
+    turns_folded: int = 0
+    tokens_before: int = 0
+    tokens_after: int = 0
+    tokens_folded: int = 0
+
+    @property
+    def tokens_saved(self) -> int:
+        # A summary can outgrow the short turns it replaced; that's no saving, not a negative one
+        return max(self.tokens_before - self.tokens_after, 0)
+
+
+class HistoryPolicy:
+    """
+    Decide how much of a conversation to resend to the model on each turn.
+
+    Keeps at most max_turns recent turns and, within those, drops the oldest
+    until the history fits in max_tokens (the newest turn is always kept).
+    When summarize is on, dropped turns are folded into a running summary that
+    rides along with the system prompt, capped at summary_chars characters.
+    Set max_turns and max_tokens to None to disable trimming.
+    """
+
+    def __init__(self, max_turns: int = 10, max_tokens: int = 4000,
+                 summarize: bool = True, summary_chars: int = 2000):
+        self.max_turns = max_turns
+        self.max_tokens = max_tokens
+        self.summarize = summarize
+        self.summary_chars = summary_chars
+
+    def apply(self, messages, tokens_folded: int = 0):
+        """
+        Return (trimmed_messages, HistoryStats) for the given history. messages may
+        have been trimmed before: pass the tokens_folded of the HistoryStats that
+        trimmed them, so tokens_before still counts the whole conversation.
+        """
+        sent = estimate_tokens(messages)
+        stats = HistoryStats(tokens_before=sent + tokens_folded, tokens_after=sent, tokens_folded=tokens_folded)
+        turns = split_turns(messages)
+        if not turns:
+            return messages, stats
+
+        # The system prompt (and any previous summary) lives in the very first request
+        head = turns[0][0]
+        system_parts = [p for p in head.parts if isinstance(p, SystemPromptPart)
+                        and not p.content.startswith(SUMMARY_PREFIX)]
+        summary = next((p.content[len(SUMMARY_PREFIX):] for p in head.parts
+                        if isinstance(p, SystemPromptPart) and p.content.startswith(SUMMARY_PREFIX)), "")
+        # Untrimmed, the summary would be the turns it stands for
+        if summary:
+            stats.tokens_before -= _summary_tokens(summary)
+
+        keep = len(turns)
+        if self.max_turns is not None:
+            keep = min(keep, max(self.max_turns, 1))
+        if self.max_tokens is not None:
+            while keep > 1 and estimate_tokens(m for t in turns[-keep:] for m in t) > self.max_tokens:
+                keep -= 1
+
+        folded, kept = turns[:-keep], turns[-keep:]
+        stats.turns_kept = len(kept)
+        stats.turns_folded = len(folded)
+        if not folded:
+            return messages, stats
+
+        if self.summarize:
+            lines = [summary] if summary else []
+            lines.extend(self._summarize_turn(turn) for turn in folded)
+            summary = "\n".join(line for line in lines if line)
+            # Keep the most recent part of the summary if it grows too long
+            summary = summary[-self.summary_chars:]
+
+        head_parts = list(system_parts)
+        if summary and self.summarize:
+            head_parts.append(SystemPromptPart(content=SUMMARY_PREFIX + summary))
+
+        first_request = kept[0][0]
+        carried = [p for p in first_request.parts if not isinstance(p, SystemPromptPart)]
+        trimmed = [replace(first_request, parts=[*head_parts, *carried])]
+        trimmed.extend(kept[0][1:])
+        for turn in kept[1:]:
+            trimmed.extend(turn)
+
+        stats.tokens_after = estimate_tokens(trimmed)
+        # Everything not sent any more, as of the next apply
+        summary_tokens = _summary_tokens(summary) if summary and self.summarize else 0
+        stats.tokens_folded = max(stats.tokens_before - (stats.tokens_after - summary_tokens), 0)
+        return trimmed, stats
+
+    @staticmethod
+    def _summarize_turn(turn) -> str:
+        """One line per folded turn: what the user asked and what the assistant answered"""
+        user_text = ""
+        for part in turn[0].parts:
+            if isinstance(part, UserPromptPart) and isinstance(part.content, str):
+                user_text = part.content.split(CART_CHANGES_PREFIX, 1)[0]
+        reply = ""
+        for message in reversed(turn):
+            if isinstance(message, ModelResponse):
+                # Plain text, or the arguments of the structured output the model returned
+                reply = " ".join(
+                    p.content if isinstance(p, TextPart) else p.args_as_json_str()
+                    for p in message.parts if isinstance(p, (TextPart, ToolCallPart))
+                )
+                if reply:
+                    break
+        user_text = " ".join(user_text.split())[:120]
+        reply = " ".join(reply.split())[:120]
+        return f"- User: {user_text} -> Assistant: {reply}" if user_text else ""
@@ -0,0 +1,166 @@
+from collections import deque
+from contextlib import asynccontextmanager
+import asyncio
+import random
+import statistics
+import time
+
+
+class Overloaded(Exception):
+    """Too many model calls are already waiting - shed this one instead of queueing it"""
+
+
+class DeadlineExceeded(TimeoutError):
+    """A model call (including its wait for a slot and any retries) took longer than its deadline"""
+
+
+def is_rate_limited(error: BaseException) -> bool:
+    """Whether the provider told us to slow down (HTTP 429)"""
+    return getattr(error, 'status_code', None) == 429
+
+
+class ModelScheduler:
+    """
+    Shared gate in front of every model call.
+
+    At most max_concurrency calls run at once; up to max_queue more wait for a slot,
+    and anything beyond that fails straight away with Overloaded so a slow or
+    rate-limited provider can't pile up requests until the process falls over.
+    Each call gets deadline seconds from the moment it asks for a slot.
+
+    run() also retries rate-limited calls with jittered exponential backoff (the
+    slot is given back while waiting), and, if hedge_after is set, starts a second
+    copy of a call that hasn't answered after hedge_after seconds - only when a
+    slot is free, so hedging never adds to a queue - and takes whichever answers first.
+    """
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 64, deadline: float = 30,
+                 max_retries: int = 3, backoff: float = 0.5, max_backoff: float = 8,
+                 hedge_after: float = None):
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.hedge_after = hedge_after
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self.active = 0
+        self.waiting = 0
+        self.calls = 0
+        self.shed = 0
+        self.timeouts = 0
+        self.retries = 0
+        self.hedges = 0
+        self.hedge_wins = 0
+        # Recent waits for a slot, in seconds
+        self._waits = deque(maxlen=1000)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether a new call would be shed right now"""
+        return self._slots.locked() and self.waiting >= self.max_queue
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the concurrency slots; raises Overloaded if the wait queue is full"""
+        if self.saturated:
+            self.shed += 1
+            raise Overloaded(f"{self.waiting} model calls are already waiting")
+        self.waiting += 1
+        start = time.monotonic()
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self._waits.append(time.monotonic() - start)
+        self.active += 1
+        try:
+            yield
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    @asynccontextmanager
+    async def deadline_for(self, seconds: float = None):
+        """Raise DeadlineExceeded if the block takes longer than seconds (default: deadline)"""
+        try:
+            async with asyncio.timeout(seconds or self.deadline):
+                yield
+        except TimeoutError as e:
+            self.timeouts += 1
+            raise DeadlineExceeded(f"the model didn't answer within {seconds or self.deadline:g}s") from e
+
+    async def run(self, call, deadline: float = None):
+        """
+        Run call() - an async function making one model request - under the scheduler's
+        limits, retrying on rate limits. call may run more than once (retries, hedges),
+        so it must not have side effects the caller can't repeat.
+        """
+        self.calls += 1
+        async with self.deadline_for(deadline):
+            attempt = 0
+            while True:
+                try:
+                    async with self.slot():
+                        return await self._hedged(call)
+                except Exception as e:
+                    if not is_rate_limited(e) or attempt >= self.max_retries:
+                        raise
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(self._backoff_delay(attempt))
+
+    def stats(self) -> dict:
+        """Queue depth, slot use, wait times (ms) and counters, for dashboards and logs"""
+        waits = sorted(self._waits)
+        return {
+            'active': self.active,
+            'waiting': self.waiting,
+            'max_concurrency': self.max_concurrency,
+            'max_queue': self.max_queue,
+            'calls': self.calls,
+            'shed': self.shed,
+            'timeouts': self.timeouts,
+            'retries': self.retries,
+            'hedges': self.hedges,
+            'hedge_wins': self.hedge_wins,
+            'wait_ms_mean': round(statistics.fmean(waits) * 1000, 3) if waits else 0.0,
+            'wait_ms_p95': round(waits[min(len(waits) - 1, int(len(waits) * 0.95))] * 1000, 3) if waits else 0.0,
+            'wait_ms_max': round(waits[-1] * 1000, 3) if waits else 0.0,
+        }
+
+    def _backoff_delay(self, attempt: int) -> float:
+        # "Full jitter": anywhere up to the exponential delay, so retries don't line up
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+
+    async def _hedged(self, call):
+        first = asyncio.ensure_future(call())
+        tasks = {first}
+        extra_slot = False
+        try:
+            if self.hedge_after is not None:
+                done, _ = await asyncio.wait(tasks, timeout=self.hedge_after)
+                if not done and not self._slots.locked():
+                    await self._slots.acquire()
+                    extra_slot = True
+                    self.hedges += 1
+                    tasks.add(asyncio.ensure_future(call()))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.hedge_wins += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            if extra_slot:
+                self._slots.release()
@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+import bisect
+import threading
+import time
+
+# Seconds, from sub-millisecond local work up to slow model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+
+def _labels(names, values, extra: str = '') -> str:
+    pairs = [f'{name}="{value}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value) -> str:
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """Monotonic count, optionally split by labels"""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help: str, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        for key, value in sorted(self._values.items()):
+            yield self.name, _labels(self.labelnames, key), value
+
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets, optionally split by labels"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+ overflow), sum, count]
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def samples(self):
+        for key, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, '+Inf'), counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket', _labels(self.labelnames, key, f'le="{bound}"'), cumulative
+            yield f'{self.name}_sum', _labels(self.labelnames, key), total
+            yield f'{self.name}_count', _labels(self.labelnames, key), count
+
+
+class Callback:
+    """A counter or gauge read from somewhere else (e.g. an existing hit counter) at scrape time"""
+
+    def __init__(self, name: str, help: str, read, kind: str = 'gauge'):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.kind = kind
+
+    def samples(self):
+        yield self.name, '', self.read()
+
+
+class Registry:
+    """Named metrics rendered together in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics = {}
+
+    def register(self, metric):
+        if metric.name in self._metrics:
+            raise ValueError(f"metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def gauge_func(self, name: str, help: str, read) -> Callback:
+        return self.register(Callback(name, help, read, 'gauge'))
+
+    def counter_func(self, name: str, help: str, read) -> Callback:
+        return self.register(Callback(name, help, read, 'counter'))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.help}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            for name, labels, value in metric.samples():
+                lines.append(f'{name}{labels} {_number(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'ecom_stage_seconds', 'Time spent in each stage of handling a chat message', ('stage',),
+)
+MODEL_TOKENS = REGISTRY.counter('ecom_model_tokens_total', 'Tokens used by model calls', ('kind',))
+MODEL_REQUESTS = REGISTRY.counter('ecom_model_requests_total', 'Agent runs, by kind of call', ('call',))
+
+
+@contextmanager
+def timed(stage: str):
+    """Record how long the block takes under ecom_stage_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def record_usage(usage, call: str):
+    """Count one agent run and the tokens it used"""
+    MODEL_REQUESTS.inc(call=call)
+    MODEL_TOKENS.inc(usage.input_tokens or 0, kind='input')
+    MODEL_TOKENS.inc(usage.output_tokens or 0, kind='output')
+
+
+def hit_rate(hits: int, misses: int) -> float:
+    """Share of lookups that were hits (0.0 before the first one)"""
+    total = hits + misses
+    return hits / total if total else 0.0
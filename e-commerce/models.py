@@ -0,0 +1,58 @@
+from pydantic import BaseModel, Field, TypeAdapter
+from typing import Annotated, List, Literal, Union
+
+
+class CartItem(BaseModel):
+    """A product to add to the cart"""
+    name: str = Field(description="Product name, properly capitalized")
+    quantity: int = Field(default=1, ge=1)
+    color: str = Field(default="", description="Natural color of the product as a hex code, e.g. #DC143C")
+    attributes: str = Field(default="", description="Color/size for clothing, e.g. 'Red, Size M'")
+
+
+class AddAction(BaseModel):
+    """Add one or more products to the cart"""
+    action: Literal["add"] = "add"
+    items: List[CartItem]
+
+
+class RemoveAction(BaseModel):
+    """Remove a product from the cart"""
+    action: Literal["remove"] = "remove"
+    name: str = Field(description="Product name, properly capitalized")
+    quantity: int = Field(default=0, ge=0, description="How many to remove; 0 removes all of it")
+
+
+class SetQuantityAction(BaseModel):
+    """Set a product's quantity in the cart; 0 removes it"""
+    action: Literal["set"] = "set"
+    name: str = Field(description="Product name, properly capitalized")
+    quantity: int = Field(ge=0)
+
+
+CartOperation = Annotated[Union[AddAction, RemoveAction, SetQuantityAction], Field(discriminator="action")]
+
+
+class BatchAction(BaseModel):
+    """Several cart changes from one message, applied in order, all or nothing"""
+    action: Literal["batch"] = "batch"
+    operations: List[CartOperation]
+
+
+class TextReply(BaseModel):
+    """Answer in plain text: questions about the cart and anything else"""
+    action: Literal["text"] = "text"
+    text: str
+
+
+CartAction = Annotated[
+    Union[AddAction, RemoveAction, SetQuantityAction, BatchAction, TextReply],
+    Field(discriminator="action"),
+]
+
+cart_action_adapter = TypeAdapter(CartAction)
+
+
+class TurnReplies(BaseModel):
+    """Replies to several numbered messages, one per message in the same order"""
+    replies: List[CartAction]
@@ -0,0 +1,261 @@
+from collections import Counter
+from functools import lru_cache
+import itertools
+import re
+
+_WORDS = re.compile(r"[a-z0-9]+")
+# How close (trigram Dice) a word must be to count as a misspelling of an indexed word
+_SIMILAR_WORD = 0.5
+
+
+def singular(word: str) -> str:
+    """Rough English singular of one lowercase word ("berries" -> "berry", "boxes" -> "box")"""
+    if len(word) <= 3 or word.isdigit():
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('ches', 'shes', 'sses', 'xes', 'zes')) or (word.endswith('oes') and len(word) > 5):
+        return word[:-2]
+    if word.endswith('s') and not word.endswith(('ss', 'us', 'is')):
+        return word[:-1]
+    return word
+
+
+def words(name: str) -> list:
+    """Lowercase singular words of a name"""
+    return [singular(word) for word in _WORDS.findall(name.lower().replace("'", ''))]
+
+
+def _index_words(name: str) -> set:
+    """Words to index a name under: its words, plus short prefixes joined to the next word ("tshirt")"""
+    found = words(name)
+    indexed = set(found)
+    for first, second in zip(found, found[1:]):
+        if len(first) <= 2:
+            indexed.add(first + second)
+    return indexed
+
+
+@lru_cache(maxsize=65536)
+def fold(name: str) -> str:
+    """
+    Case-, punctuation-, spacing- and plural-insensitive form of a product name:
+    "T-Shirts", "tshirt" and "T shirt" all fold to "tshirt".
+    """
+    return ''.join(words(name))
+
+
+def trigrams(folded: str) -> set:
+    padded = f"^{folded}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class Match:
+    """Result of ProductIndex.resolve: the best values found, how sure we are, and the runners-up"""
+
+    __slots__ = ('values', 'confidence', 'ambiguous', 'alternatives')
+
+    def __init__(self, values: list, confidence: float, ambiguous: bool = False, alternatives: list = ()):
+        self.values = values
+        self.confidence = confidence
+        self.ambiguous = ambiguous
+        self.alternatives = list(alternatives)
+
+    def __bool__(self):
+        return bool(self.values)
+
+    def __repr__(self):
+        return (f"Match({self.values!r}, confidence={self.confidence:.2f}, "
+                f"ambiguous={self.ambiguous}, alternatives={self.alternatives!r})")
+
+
+NO_MATCH = Match([], 0.0)
+
+
+class ProductIndex:
+    """
+    Product names mapped to values (e.g. cart keys), found by name two ways:
+
+    - exact folded name (see fold): O(1), so "Apple", "apples" and "T-shirt"/"Tshirt" match
+    - fuzzy: names sharing words (or near-misses of words, like "bananna") with the
+      query are found through an inverted word index, then scored by Dice similarity
+      of the character trigrams of the folded names - the match confidence
+
+    The word index is only built the first time a fuzzy lookup needs it, and is kept
+    up to date from then on, so indexes that only ever see exact lookups (most carts)
+    never pay for it.
+    """
+
+    # Most names scored with trigrams per search
+    max_candidates = 32
+
+    def __init__(self, names=()):
+        self._entries = {}      # folded name -> {value: None}, in insertion order
+        self._ids = {}          # folded name -> id, once the word index exists
+        self._folded = []       # id -> folded name (None once removed)
+        self._free = []         # ids of removed names, for reuse
+        self._postings = None   # word -> {ids}
+        self._vocabulary = {}   # word trigram -> {words}, for misspelled words
+        self._word_sizes = {}   # word -> number of trigrams
+        self._names = {}        # folded name -> the name it was first added as
+        for name in names:
+            self.add(name)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, name: str, value=None):
+        """Index value (default: the name itself) under name"""
+        folded = fold(name)
+        if not folded:
+            return
+        values = self._entries.get(folded)
+        if values is None:
+            values = self._entries[folded] = {}
+            self._names[folded] = name
+            if self._postings is not None:
+                self._index(folded)
+        values[name if value is None else value] = None
+
+    def discard(self, name: str, value=None):
+        """Remove value from name's entry, dropping the name once nothing is left"""
+        folded = fold(name)
+        values = self._entries.get(folded)
+        if values is None:
+            return
+        values.pop(name if value is None else value, None)
+        if not values:
+            del self._entries[folded]
+            if self._postings is not None:
+                self._unindex(folded)
+            del self._names[folded]
+
+    def lookup(self, name: str) -> list:
+        """Values whose name folds to the same thing as name"""
+        return list(self._entries.get(fold(name), ()))
+
+    def search(self, name: str, limit: int = 5, min_score: float = 0.5) -> list:
+        """Up to limit (score, folded name, values), best first, scoring at least min_score"""
+        return self._search(name, limit, min_score)[0]
+
+    def resolve(self, name: str, min_score: float = 0.6, margin: float = 0.08) -> Match:
+        """
+        The best entry for name, with a confidence between 0 and 1.
+
+        Exact folded matches have confidence 1. A fuzzy match is ambiguous when the
+        runner-up scores within margin of it (alternatives lists the runners-up), when
+        several names have every word of the query, or when too many names share the
+        query's words to score them all.
+        """
+        results, undecided = self._search(name, 4, min_score)
+        if not results:
+            return NO_MATCH
+        score, _, values = results[0]
+        close = [other for other_score, _, other in results[1:] if score - other_score < margin]
+        return Match(values, score, ambiguous=bool(close) or (undecided and score < 1),
+                     alternatives=[value for other in close for value in other])
+
+    def _search(self, name: str, limit: int, min_score: float) -> tuple:
+        # (results, whether words alone can't tell the candidates apart)
+        folded = fold(name)
+        if not folded:
+            return [], False
+        values = self._entries.get(folded)
+        if values:
+            return [(1.0, folded, list(values))], False
+
+        self.build()
+        # Narrow down to the names with as many of the query's words as possible: start
+        # with the rarest word and keep every further word that still leaves some names.
+        # Words found as spelled go first, as misspellings are the weaker evidence.
+        groups = sorted((self._with_word(word) for word in set(words(name))),
+                        key=lambda group: (not group[1], len(group[0])))
+        candidates = None
+        every_word = True
+        for ids, spelled in groups:
+            if candidates is None:
+                candidates = ids or None
+            elif both := candidates & ids:
+                candidates = both
+            else:
+                every_word = False
+            every_word = every_word and spelled
+        if not candidates:
+            return [], False
+
+        query = trigrams(folded)
+        scored = []
+        for i in itertools.islice(candidates, self.max_candidates):
+            candidate = self._folded[i]
+            grams = trigrams(candidate)
+            score = 2 * len(query & grams) / (len(query) + len(grams))
+            if score >= min_score:
+                scored.append((score, candidate))
+        scored.sort(key=lambda result: (-result[0], result[1]))
+        results = [(score, candidate, list(self._entries[candidate])) for score, candidate in scored[:limit]]
+        # Names with every word as spelled differ only in words the shopper didn't say
+        return results, len(candidates) > self.max_candidates or (every_word and len(candidates) > 1)
+
+    def _with_word(self, word: str) -> tuple:
+        """
+        (ids of names with word, True), or if no name has it, (ids of names with
+        words spelled like it, False)
+        """
+        ids = self._postings.get(word)
+        if ids is not None:
+            return ids, True
+        query = trigrams(word)
+        shared = Counter()
+        for gram in query:
+            shared.update(self._vocabulary.get(gram, ()))
+        ids = set()
+        for match, count in shared.items():
+            if 2 * count / (len(query) + self._word_sizes[match]) >= _SIMILAR_WORD:
+                ids |= self._postings[match]
+        return ids, False
+
+    def build(self):
+        """Build the word index now instead of on the first fuzzy lookup"""
+        if self._postings is None:
+            self._postings = {}
+            for folded in self._entries:
+                self._index(folded)
+
+    def _index(self, folded: str):
+        if self._free:
+            i = self._free.pop()
+            self._folded[i] = folded
+        else:
+            i = len(self._folded)
+            self._folded.append(folded)
+        self._ids[folded] = i
+        for word in _index_words(self._names[folded]):
+            posting = self._postings.get(word)
+            if posting is None:
+                posting = self._postings[word] = set()
+                grams = trigrams(word)
+                self._word_sizes[word] = len(grams)
+                for gram in grams:
+                    self._vocabulary.setdefault(gram, set()).add(word)
+            posting.add(i)
+
+    def _unindex(self, folded: str):
+        i = self._ids.pop(folded)
+        self._folded[i] = None
+        self._free.append(i)
+        for word in _index_words(self._names[folded]):
+            posting = self._postings[word]
+            posting.discard(i)
+            if not posting:
+                del self._postings[word]
+                del self._word_sizes[word]
+                for gram in trigrams(word):
+                    self._vocabulary[gram].discard(word)
+
+
+def load_catalog(path: str) -> ProductIndex:
+    """ProductIndex of a product catalog file with one product name per line, ready for fuzzy lookups"""
+    with open(path, encoding='utf-8') as f:
+        index = ProductIndex(line.strip() for line in f if line.strip())
+    index.build()
+    return index
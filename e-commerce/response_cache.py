@@ -0,0 +1,217 @@
+from collections import OrderedDict
+import asyncio
+import sqlite3
+import time
+from metrics import hit_rate
+from models import BatchAction, cart_action_adapter
+from product_index import words
+
+# Words that point back at the conversation or the cart ("add another one", "remove
+# it", "same again"): the same prompt means something else for another shopper
+CONTEXT_WORDS = frozenset(
+    "it its them they that those this these another other others same again "
+    "rest last previous double triple half".split()
+)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """
+    Cache key for a prompt: "Add 3 apples!" and "add  3 apples" are the same command.
+    A trailing '?' is kept, so a question never shares a key with the command it quotes.
+    """
+    return ' '.join(prompt.lower().split()).strip('.!')
+
+
+def refers_to_context(prompt: str) -> bool:
+    """Whether prompt leans on what was said or bought before, so its action can't be shared"""
+    return not CONTEXT_WORDS.isdisjoint(words(prompt))
+
+
+def product_names(action) -> list:
+    """Names of the products an add/remove/set (or batch of them) acts on"""
+    if isinstance(action, BatchAction):
+        return [name for operation in action.operations for name in product_names(operation)]
+    if hasattr(action, 'items'):
+        return [item.name for item in action.items]
+    return [action.name]
+
+
+def is_reusable(prompt: str, action) -> bool:
+    """
+    Whether action is what prompt means for anyone: the prompt doesn't refer back to
+    the conversation, and names every product the action touches
+    """
+    if refers_to_context(prompt):
+        return False
+    said = set(words(prompt))
+    return all(set(words(name)) <= said for name in product_names(action))
+
+
+class MemoryBackend:
+    """Per-process LRU storage for cached actions"""
+
+    def __init__(self, max_entries: int = 5000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key: str):
+        """Return (value, stored_at) or None"""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+        return entry
+
+    def set(self, key: str, value: str):
+        self._entries[key] = (value, time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class DiskBackend:
+    """SQLite storage for cached actions, so the cache survives restarts"""
+
+    def __init__(self, path: str, max_entries: int = 50_000):
+        self.max_entries = max_entries
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS action_cache ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, stored_at REAL NOT NULL, used_at REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS action_cache_used ON action_cache (used_at)")
+
+    def get(self, key: str):
+        """Return (value, stored_at) or None"""
+        row = self._db.execute(
+            "SELECT value, stored_at FROM action_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is not None:
+            self._db.execute("UPDATE action_cache SET used_at = ? WHERE key = ?", (time.time(), key))
+        return row
+
+    def set(self, key: str, value: str):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO action_cache (key, value, stored_at, used_at) VALUES (?, ?, ?, ?)",
+            (key, value, now, now),
+        )
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM action_cache WHERE key IN "
+                "(SELECT key FROM action_cache ORDER BY used_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def delete(self, key: str):
+        self._db.execute("DELETE FROM action_cache WHERE key = ?", (key,))
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM action_cache").fetchone()[0]
+
+
+class ActionCache:
+    """
+    Cache of parsed add/remove actions keyed by normalized prompt.
+
+    Only actions are cached - text replies (e.g. questions about the cart) depend
+    on the shopper's cart and always go to the agent. So do prompts that refer back
+    to the conversation ("add another one") and actions on products the prompt
+    doesn't name (see is_reusable): they are never stored, looked up or shared.
+    Concurrent misses for the same prompt share a single in-flight agent call.
+    """
+
+    def __init__(self, backend=None, ttl: float = 24 * 60 * 60):
+        self.backend = backend if backend is not None else MemoryBackend()
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self._inflight = {}
+
+    @property
+    def hit_rate(self) -> float:
+        return hit_rate(self.hits, self.misses)
+
+    def get(self, prompt: str):
+        """Return the cached action for prompt, or None"""
+        if refers_to_context(prompt):
+            return None
+        key = normalize_prompt(prompt)
+        entry = self.backend.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        if time.time() - stored_at > self.ttl:
+            self.backend.delete(key)
+            return None
+        return cart_action_adapter.validate_json(value)
+
+    def lookup(self, prompt: str):
+        """get() that also counts the hit or miss, for callers that fetch on their own"""
+        action = self.get(prompt)
+        if action is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return action
+
+    def put(self, prompt: str, action) -> bool:
+        """Store action for prompt if it's reusable (see is_reusable); returns whether it was"""
+        if not is_reusable(prompt, action):
+            return False
+        self.backend.set(normalize_prompt(prompt), action.model_dump_json())
+        return True
+
+    async def get_or_fetch(self, prompt: str, fetch, looked_up: bool = False):
+        """
+        Return (action, response_text) for prompt.
+
+        fetch is an async callable returning (action or None, response_text).
+        On a cache hit response_text is None. looked_up means the caller already
+        counted a lookup() for prompt, so this call isn't counted again.
+        """
+        count = int(not looked_up)
+        if refers_to_context(prompt):
+            # Means something different in every conversation: never shared
+            self.misses += count
+            return await fetch()
+
+        action = self.get(prompt)
+        if action is not None:
+            self.hits += count
+            return action, None
+
+        key = normalize_prompt(prompt)
+        leader = self._inflight.get(key)
+        if leader is not None:
+            # Someone is already asking the agent the same thing - wait for them
+            self.coalesced += 1
+            action = await asyncio.shield(leader)
+            if action is not None:
+                self.hits += count
+                return action, None
+            # They got a text reply (which may depend on their cart) or an action the
+            # prompt doesn't pin down - ask ourselves
+
+        self.misses += count
+        if leader is not None:
+            return await fetch()
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        shared = None
+        try:
+            action, response = await fetch()
+            shared = action if action is not None and self.put(prompt, action) else None
+            return action, response
+        finally:
+            del self._inflight[key]
+            future.set_result(shared)
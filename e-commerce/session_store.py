@@ -0,0 +1,329 @@
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from pydantic_ai.messages import ModelMessagesTypeAdapter
+from cart import Cart
+
+
+class SessionState:
+    """Everything that belongs to a single shopper: cart, chat transcript and agent history"""
+
+    __slots__ = ('sid', 'cart', 'messages', 'message_history', 'history_tokens_folded', 'pending',
+                 'last_seen', 'lock')
+
+    def __init__(self, sid: str):
+        self.sid = sid
+        self.last_seen = time.monotonic()
+        # Held by SessionStore.session() so one request at a time changes this shopper
+        self.lock = asyncio.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start the shopper over with an empty cart and conversation"""
+        # Store messages as tuples (user_message, response)
+        self.messages = []
+        self.cart = Cart()
+        # pydantic-ai messages for this shopper only
+        self.message_history = []
+        # Tokens of turns trimmed out of message_history so far (see HistoryPolicy.apply)
+        self.history_tokens_folded = 0
+        # Prompts waiting for their streamed reply, keyed by turn id (see SessionStore.add_pending)
+        self.pending = {}
+
+    def to_json(self) -> str:
+        """Serialize the cart, transcript and history, for stores shared between processes"""
+        return json.dumps({
+            'messages': self.messages,
+            'cart': self.cart.to_dict(),
+            'message_history': ModelMessagesTypeAdapter.dump_python(self.message_history, mode='json'),
+            'history_tokens_folded': self.history_tokens_folded,
+        })
+
+    @classmethod
+    def from_json(cls, sid: str, data: str) -> 'SessionState':
+        state = cls(sid)
+        data = json.loads(data)
+        state.messages = [tuple(message) for message in data['messages']]
+        state.cart = Cart.from_dict(data['cart'])
+        state.message_history = ModelMessagesTypeAdapter.validate_python(data['message_history'])
+        state.history_tokens_folded = data.get('history_tokens_folded', 0)
+        return state
+
+
+class SessionStore:
+    """
+    Bounded, session-keyed store of SessionState objects.
+
+    Sessions are kept in an OrderedDict in least-recently-used order, so lookup,
+    touch and eviction are all O(1). A session is evicted when it has been idle
+    for longer than idle_ttl seconds, or when the store grows past max_sessions
+    (the least recently used shopper goes first).
+    """
+
+    def __init__(self, max_sessions: int = 10_000, idle_ttl: float = 30 * 60):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    @staticmethod
+    def new_session_id() -> str:
+        """Generate a new unguessable session id"""
+        return uuid.uuid4().hex
+
+    def get(self, sid: str) -> SessionState:
+        """Return the state for sid, creating it if it's new or has been evicted"""
+        now = time.monotonic()
+        with self._lock:
+            state = self._sessions.get(sid)
+            if state is not None and now - state.last_seen > self.idle_ttl:
+                # Expired but not swept yet - hand out a fresh state instead
+                del self._sessions[sid]
+                self.evictions += 1
+                state = None
+
+            if state is None:
+                state = SessionState(sid)
+                self._sessions[sid] = state
+            else:
+                self._sessions.move_to_end(sid)
+
+            state.last_seen = now
+            self._evict(now)
+            return state
+
+    @asynccontextmanager
+    async def session(self, sid: str):
+        """
+        The state for sid, for the duration of one request.
+
+        Every store has this method. Here the state lives in this process, so there's
+        nothing to load or save - the shopper's lock is held so requests take turns.
+        """
+        state = self.get(sid)
+        async with state.lock:
+            yield state
+
+    async def add_pending(self, sid: str, turn_id: str, prompt: str):
+        """Remember a prompt until its reply is streamed; doesn't wait for the session lock"""
+        self.get(sid).pending[turn_id] = prompt
+
+    async def pop_pending(self, sid: str, turn_id: str):
+        """Take back a prompt saved with add_pending, or None if it's gone (or was taken already)"""
+        return self.get(sid).pending.pop(turn_id, None)
+
+    def discard(self, sid: str):
+        """Forget a session entirely"""
+        with self._lock:
+            self._sessions.pop(sid, None)
+
+    def __contains__(self, sid: str) -> bool:
+        return sid in self._sessions
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _evict(self, now: float):
+        # Oldest sessions are at the front, so we only ever look at the head
+        while self._sessions:
+            sid, state = next(iter(self._sessions.items()))
+            if len(self._sessions) > self.max_sessions or now - state.last_seen > self.idle_ttl:
+                del self._sessions[sid]
+                self.evictions += 1
+            else:
+                break
+
+
+class SessionBusy(TimeoutError):
+    """Another request held the shopper's session (or the database) for longer than lock_timeout"""
+
+
+class SqliteSessionStore:
+    """
+    Session store in a SQLite database (WAL mode), shared by every worker process.
+
+    Each session is one row holding its serialized SessionState. A request claims
+    the row with a lease (lock_owner / locked_until) before loading it and gives it
+    up when it saves, so two workers never interleave changes to the same shopper
+    while other shoppers carry on in parallel. A lease left behind by a crashed
+    worker expires after lease seconds. Idle and excess sessions are swept now and
+    then, like SessionStore.
+
+    The database is used from the event loop, so SQLite itself only waits
+    busy_timeout seconds for another worker's write to finish. Past that, statements
+    are retried with backoff by sleeping on the loop, for up to lock_timeout seconds,
+    so a busy database slows down this shopper rather than every request.
+    """
+
+    def __init__(self, path: str, max_sessions: int = 10_000, idle_ttl: float = 30 * 60,
+                 lease: float = 120, lock_timeout: float = 30, sweep_every: int = 200,
+                 busy_timeout: float = 0.005):
+        if max_sessions < 1:
+            raise ValueError("max_sessions must be at least 1")
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.lease = lease
+        self.lock_timeout = lock_timeout
+        self.sweep_every = sweep_every
+        self.evictions = 0
+        self.busy_retries = 0
+        self._uses = 0
+        # Setting up the schema may wait for other workers as long as it takes
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=lock_timeout)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "sid TEXT PRIMARY KEY, state TEXT, last_seen REAL NOT NULL, "
+            "lock_owner TEXT, locked_until REAL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS sessions_last_seen ON sessions (last_seen)")
+        # Prompts waiting for their streamed reply. Kept apart from the session row so
+        # adding one doesn't have to wait for the session's lease.
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pending_turns ("
+            "turn_id TEXT PRIMARY KEY, sid TEXT NOT NULL, prompt TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._db.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+
+    new_session_id = staticmethod(SessionStore.new_session_id)
+
+    @asynccontextmanager
+    async def session(self, sid: str):
+        """
+        Lock, load and yield the state for sid, then save it and unlock.
+
+        Waits (without blocking the event loop) while another request holds the
+        session, and raises SessionBusy after lock_timeout seconds. If the block
+        raises, the state is not saved.
+        """
+        owner = uuid.uuid4().hex
+        await self._acquire(sid, owner)
+        saved = False
+        try:
+            state = await self._load(sid)
+            yield state
+            await self._save(state, owner)
+            saved = True
+        finally:
+            if not saved:
+                await self._release(sid, owner)
+
+    async def add_pending(self, sid: str, turn_id: str, prompt: str):
+        """Remember a prompt until its reply is streamed; doesn't wait for the session lease"""
+        await self._execute(
+            "INSERT INTO pending_turns (turn_id, sid, prompt, created) VALUES (?, ?, ?, ?)",
+            (turn_id, sid, prompt, time.time()),
+        )
+
+    async def pop_pending(self, sid: str, turn_id: str):
+        """Take back a prompt saved with add_pending, or None if it's gone (or was taken already)"""
+        row = (await self._execute(
+            "DELETE FROM pending_turns WHERE turn_id = ? AND sid = ? RETURNING prompt", (turn_id, sid)
+        )).fetchone()
+        return row[0] if row else None
+
+    def discard(self, sid: str):
+        """Forget a session entirely"""
+        self._db.execute("DELETE FROM sessions WHERE sid = ?", (sid,))
+        self._db.execute("DELETE FROM pending_turns WHERE sid = ?", (sid,))
+
+    def __contains__(self, sid: str) -> bool:
+        row = self._db.execute(
+            "SELECT 1 FROM sessions WHERE sid = ? AND state IS NOT NULL AND last_seen >= ?",
+            (sid, time.time() - self.idle_ttl),
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    async def _execute(self, sql: str, parameters=()) -> sqlite3.Cursor:
+        """Run a statement, backing off on the event loop while another worker holds the database"""
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.002
+        while True:
+            try:
+                return self._db.execute(sql, parameters)
+            except sqlite3.OperationalError as e:
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                if time.monotonic() > deadline:
+                    raise SessionBusy("the session database is busy") from e
+            self.busy_retries += 1
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    async def _acquire(self, sid: str, owner: str):
+        deadline = time.monotonic() + self.lock_timeout
+        delay = 0.002
+        while True:
+            now = time.time()
+            # Insert the row, or take it over if nobody holds a live lease on it
+            claimed = (await self._execute(
+                "INSERT INTO sessions (sid, state, last_seen, lock_owner, locked_until) "
+                "VALUES (?, NULL, ?, ?, ?) "
+                "ON CONFLICT (sid) DO UPDATE SET lock_owner = excluded.lock_owner, "
+                "locked_until = excluded.locked_until "
+                "WHERE lock_owner IS NULL OR locked_until < ?",
+                (sid, now, owner, now + self.lease, now),
+            )).rowcount
+            if claimed:
+                return
+            if time.monotonic() > deadline:
+                raise SessionBusy(f"session {sid} is busy")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 0.05)
+
+    async def _load(self, sid: str) -> SessionState:
+        state, last_seen = (await self._execute(
+            "SELECT state, last_seen FROM sessions WHERE sid = ?", (sid,)
+        )).fetchone()
+        if state is None:
+            return SessionState(sid)
+        if time.time() - last_seen > self.idle_ttl:
+            # Expired but not swept yet - start over
+            self.evictions += 1
+            return SessionState(sid)
+        return SessionState.from_json(sid, state)
+
+    async def _save(self, state: SessionState, owner: str):
+        await self._execute(
+            "UPDATE sessions SET state = ?, last_seen = ?, lock_owner = NULL, locked_until = NULL "
+            "WHERE sid = ? AND lock_owner = ?",
+            (state.to_json(), time.time(), state.sid, owner),
+        )
+        self._uses += 1
+        if self._uses % self.sweep_every == 0:
+            await self._evict()
+
+    async def _release(self, sid: str, owner: str):
+        await self._execute(
+            "UPDATE sessions SET lock_owner = NULL, locked_until = NULL WHERE sid = ? AND lock_owner = ?",
+            (sid, owner),
+        )
+
+    async def _evict(self):
+        now = time.time()
+        unlocked = "(lock_owner IS NULL OR locked_until < ?)"
+        removed = (await self._execute(
+            f"DELETE FROM sessions WHERE last_seen < ? AND {unlocked}", (now - self.idle_ttl, now)
+        )).rowcount
+        await self._execute("DELETE FROM pending_turns WHERE created < ?", (now - self.idle_ttl,))
+        count = (await self._execute("SELECT COUNT(*) FROM sessions")).fetchone()[0]
+        overflow = count - self.max_sessions
+        if overflow > 0:
+            removed += (await self._execute(
+                f"DELETE FROM sessions WHERE sid IN (SELECT sid FROM sessions WHERE {unlocked} "
+                "ORDER BY last_seen LIMIT ?)",
+                (now, overflow),
+            )).rowcount
+        self.evictions += removed
@@ -0,0 +1,92 @@
+from email.utils import formatdate, parsedate_to_datetime
+from starlette.responses import Response
+import gzip
+import hashlib
+import time
+
+try:
+    import brotli
+except ImportError:  # optional: without it, clients get gzip
+    brotli = None
+
+
+def _accepted(accept_encoding: str) -> dict:
+    """Accept-Encoding as {coding: q}"""
+    accepted = {}
+    for part in accept_encoding.lower().split(','):
+        coding, _, params = part.strip().partition(';')
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(';'):
+            name, _, value = param.strip().partition('=')
+            if name == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
+
+
+class StaticAsset:
+    """
+    A response body that never changes while the process runs, rendered once and
+    served as bytes.
+
+    The body is compressed up front (gzip, and brotli if installed), so serving it
+    is a dict lookup on Accept-Encoding. Responses carry a weak ETag (the same for
+    every encoding) and Last-Modified, and conditional requests that match get an
+    empty 304.
+    """
+
+    def __init__(self, content, media_type: str, cache_control: str = 'no-cache'):
+        body = content.encode() if isinstance(content, str) else content
+        self.media_type = media_type
+        self.etag = f'W/"{hashlib.sha256(body).hexdigest()[:20]}"'
+        self.last_modified = formatdate(time.time(), usegmt=True)
+        self._modified = parsedate_to_datetime(self.last_modified)
+        self.headers = {
+            'ETag': self.etag,
+            'Last-Modified': self.last_modified,
+            'Cache-Control': cache_control,
+            'Vary': 'Accept-Encoding',
+        }
+        # Best first; identity last so it's always there
+        self.bodies = {}
+        if brotli is not None:
+            self.bodies['br'] = brotli.compress(body, quality=11)
+        self.bodies['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+        self.bodies['identity'] = body
+
+    def not_modified(self, headers) -> bool:
+        """Whether a request with these headers already has the current body"""
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+            return '*' in tags or self.etag.removeprefix('W/') in tags
+        if_modified_since = headers.get('if-modified-since')
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since) >= self._modified
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def encoding_for(self, accept_encoding: str) -> str:
+        """The best encoding we have that the client accepts"""
+        accepted = _accepted(accept_encoding)
+        for coding in self.bodies:
+            q = accepted.get(coding, accepted.get('*', 1.0 if coding == 'identity' else 0.0))
+            if q > 0:
+                return coding
+        return 'identity'
+
+    def response(self, request) -> Response:
+        if self.not_modified(request.headers):
+            return Response(status_code=304, headers=self.headers)
+        coding = self.encoding_for(request.headers.get('accept-encoding', ''))
+        headers = dict(self.headers)
+        if coding != 'identity':
+            headers['Content-Encoding'] = coding
+        return Response(self.bodies[coding], media_type=self.media_type, headers=headers)
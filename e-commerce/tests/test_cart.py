@@ -0,0 +1,89 @@
+import pytest
+
+from cart import Cart
+
+
+def lines(cart):
+    return [(line.key, line.quantity) for line in cart]
+
+
+def failed_transaction(cart, *operations):
+    """Run operations in one transaction that then fails, as apply_action does on ActionFailed"""
+    with pytest.raises(RuntimeError):
+        with cart.transaction():
+            for operation in operations:
+                operation(cart)
+            raise RuntimeError("operation failed")
+
+
+@pytest.fixture
+def cart():
+    cart = Cart()
+    cart.add("Apples", 3, color="#DC143C")
+    cart.add("Pear", 1)
+    cart.drain_changes()
+    return cart
+
+
+def test_rollback_of_remove_then_add_again(cart):
+    failed_transaction(cart, lambda c: c.remove("Apples"), lambda c: c.add("Apples", 2))
+    assert lines(cart) == [("Apples", 3), ("Pear", 1)]
+    assert cart.total_quantity == 4
+    assert cart.peek_changes() == []
+
+
+def test_rollback_of_set_to_zero_then_add(cart):
+    failed_transaction(cart, lambda c: c.set_quantity("Apples", 0), lambda c: c.add("Apples", 5))
+    assert lines(cart) == [("Apples", 3), ("Pear", 1)]
+    assert cart.total_quantity == 4
+    assert cart.peek_changes() == []
+    assert cart.get("Apples").color == "#DC143C"
+
+
+def test_transaction_commits_every_change(cart):
+    with cart.transaction():
+        cart.remove("Apples", 1)
+        cart.add("Grapes", 4)
+        cart.set_quantity("Pear", 3)
+    assert lines(cart) == [("Apples", 2), ("Pear", 3), ("Grapes", 4)]
+    assert cart.total_quantity == 9
+    assert {line.key: delta for line, delta in cart.drain_changes()} == {"Apples": -1, "Grapes": 4, "Pear": 2}
+
+
+def test_rollback_restores_lines_in_order(cart):
+    cart.add("Grapes", 2)
+    cart.drain_changes()
+    failed_transaction(cart, lambda c: c.remove("Apples"), lambda c: c.remove("Pear", 1), lambda c: c.add("Kiwi", 1))
+    assert lines(cart) == [("Apples", 3), ("Pear", 1), ("Grapes", 2)]
+    assert cart.total_quantity == 6
+    assert "Kiwi" not in cart
+    assert cart.peek_changes() == []
+
+
+def test_rollback_keeps_changes_from_before_the_transaction(cart):
+    cart.add("Apples", 2)
+    failed_transaction(cart, lambda c: c.remove("Apples"))
+    assert [(line.key, delta) for line, delta in cart.peek_changes()] == [("Apples", 2)]
+
+
+def test_nested_transaction_is_rolled_back_with_the_outer_one(cart):
+    def nested(c):
+        with c.transaction():
+            c.add("Kiwi", 2)
+    failed_transaction(cart, nested, lambda c: c.add("Apples", 1))
+    assert lines(cart) == [("Apples", 3), ("Pear", 1)]
+    assert cart.total_quantity == 4
+
+
+def test_rolled_back_cart_still_matches_names(cart):
+    failed_transaction(cart, lambda c: c.remove("Apples"), lambda c: c.add("Apples", 2))
+    assert cart.match("apple").values == [cart.get("Apples")]
+    assert cart.match("Aples").values == [cart.get("Apples")]
+    assert cart.lines_for("apples") == [cart.get("Apples")]
+
+
+def test_rolled_back_cart_survives_a_round_trip(cart):
+    failed_transaction(cart, lambda c: c.set_quantity("Pear", 0), lambda c: c.add("Pear", 7))
+    restored = Cart.from_dict(cart.to_dict())
+    assert lines(restored) == lines(cart)
+    assert restored.total_quantity == cart.total_quantity == 4
@@ -0,0 +1,13 @@
+import pytest
+
+from fast_path import parse_command
+from models import RemoveAction
+
+
+@pytest.mark.parametrize('prompt', ['remove 0 grapes', 'drop 0 apples', '0 apples', 'add 0 pears'])
+def test_zero_quantity_goes_to_the_agent(prompt):
+    assert parse_command(prompt) is None
+
+
+def test_remove_without_quantity_removes_all():
+    assert parse_command('remove the grapes') == RemoveAction(name='Grapes', quantity=0)
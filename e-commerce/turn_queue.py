@@ -0,0 +1,97 @@
+from collections import deque
+import asyncio
+import time
+
+
+class Turn:
+    """
+    One chat message waiting for its shopper's turn.
+
+    action is set up front when it's already known (fast path, action cache);
+    otherwise the agent is asked for it. A streamed turn gets the reply text
+    through chunks() while the agent is still generating it.
+    """
+
+    __slots__ = ('prompt', 'action', 'stream', 'result', 'queued_at', '_chunks')
+
+    def __init__(self, prompt: str, action=None, stream: bool = False):
+        self.prompt = prompt
+        self.action = action
+        self.stream = stream
+        self.result = asyncio.get_running_loop().create_future()
+        self.queued_at = time.perf_counter()
+        self._chunks = asyncio.Queue() if stream else None
+
+    def send_chunk(self, text: str):
+        if self._chunks is not None:
+            self._chunks.put_nowait(text)
+
+    async def chunks(self):
+        """Reply text as it arrives; ends once the turn is finished"""
+        while True:
+            text = await self._chunks.get()
+            if text is None:
+                return
+            yield text
+
+    def finish(self, result):
+        if not self.result.done():
+            self.result.set_result(result)
+        self.send_chunk(None)
+
+    def fail(self, error: BaseException):
+        if not self.result.done():
+            self.result.set_exception(error)
+            # Don't warn about errors nobody waited for (e.g. the browser went away)
+            self.result.exception()
+        self.send_chunk(None)
+
+
+class TurnQueue:
+    """
+    Runs each shopper's turns one batch at a time, in the order they arrived.
+
+    One drain task per session takes every queued turn (up to max_batch) and hands
+    the batch to process(sid, turns), which must finish or fail each turn. Turns
+    that arrive while a batch is being processed - e.g. while the agent is thinking -
+    wait and go together in the next one, so a fast typist's messages cost a single
+    agent call. Different shoppers' queues run concurrently.
+    """
+
+    def __init__(self, process, max_batch: int = 8):
+        self.process = process
+        self.max_batch = max_batch
+        self.batches = 0
+        self.coalesced = 0
+        self._queues = {}
+        self._tasks = set()
+
+    def submit(self, sid: str, turn: Turn) -> Turn:
+        """Queue a turn for sid; await turn.result for the outcome"""
+        queue = self._queues.get(sid)
+        if queue is None:
+            queue = self._queues[sid] = deque()
+            task = asyncio.create_task(self._drain(sid, queue))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        queue.append(turn)
+        return turn
+
+    def __len__(self) -> int:
+        """Number of turns waiting, across all sessions"""
+        return sum(len(queue) for queue in self._queues.values())
+
+    async def _drain(self, sid: str, queue: deque):
+        try:
+            while queue:
+                batch = [queue.popleft() for _ in range(min(len(queue), self.max_batch))]
+                self.batches += 1
+                self.coalesced += len(batch) - 1
+                try:
+                    await self.process(sid, batch)
+                except Exception as e:
+                    for turn in batch:
+                        turn.fail(e)
+        finally:
+            # Nothing can be queued between the empty check and here - no await in between
+            del self._queues[sid]
@@ -0,0 +1,153 @@
+"""
+Benchmark of per-search connection overhead: a new httpx client per search (how
+web_search used to work) against the pooled, long-lived client from http_client.
+
+Searches run through SearchEngine against a local stub server standing in for
+DuckDuckGo and Wikipedia. The stub waits --connect-delay seconds before serving a
+new connection, standing in for the DNS + TCP + TLS setup a real search pays for
+each host; requests on a kept-alive connection are answered after --latency.
+
+It prints per-search latency (ms) and how many connections were opened.
+
+Usage:
+    python benchmarks/bench_http_client.py [--searches 200] [--concurrency 4] [--connect-delay 0.05]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import http_client
+import search_engine
+from search_engine import SearchEngine
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--searches', type=int, default=200, help="searches per client setup")
+    parser.add_argument('--concurrency', type=int, default=4, help="searches in flight at once")
+    parser.add_argument('--connect-delay', type=float, default=0.05, help="seconds to set up a connection")
+    parser.add_argument('--latency', type=float, default=0.005, help="seconds to answer a request")
+    return parser.parse_args()
+
+
+def stub_body(path: str, params: dict) -> bytes:
+    """Responses that make every source run: no instant answer, no descriptions, one extract"""
+    if path == '/ddg':
+        return json.dumps({"Abstract": "", "RelatedTopics": []}).encode()
+    if path == '/html':
+        return b"<html></html>"
+    if params.get('action') == 'opensearch':
+        return json.dumps([params['search'], ["Stub Page"], [""], ["http://stub/wiki/Stub_Page"]]).encode()
+    page = {"title": "Stub Page", "extract": "A stub page. " * 20, "fullurl": "http://stub/wiki/Stub_Page"}
+    return json.dumps({"query": {"pages": {"1": page}}}).encode()
+
+
+class StubServer:
+    """A keep-alive HTTP/1.1 server on its own thread and event loop"""
+
+    def __init__(self, connect_delay: float, latency: float):
+        self.connect_delay = connect_delay
+        self.latency = latency
+        self.connections = 0
+        self.requests = 0
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+        self._ready.wait()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        server = self._loop.run_until_complete(asyncio.start_server(self._serve, '127.0.0.1', 0))
+        self.port = server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        await asyncio.sleep(self.connect_delay)
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                target = head.split(b" ", 2)[1].decode()
+                url = urlsplit(target)
+                params = {key: values[0] for key, values in parse_qs(url.query).items()}
+                await asyncio.sleep(self.latency)
+                body = stub_body(url.path, params)
+                self.requests += 1
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\nConnection: keep-alive\r\n\r\n" % len(body) + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+
+async def run_searches(engine: SearchEngine, client_for, searches: int, concurrency: int) -> list:
+    """Latencies (ms, sorted) of searches made with client_for(), concurrency at a time"""
+    latencies = []
+    queue = list(range(searches))
+
+    async def worker():
+        while queue:
+            i = queue.pop()
+            async with client_for() as client:
+                start = time.perf_counter()
+                results = await engine.search(client, f"stub query {i}")
+                latencies.append((time.perf_counter() - start) * 1000)
+                assert results, "stub search found nothing"
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return sorted(latencies)
+
+
+class _Shared:
+    """Context manager handing out the pooled client without closing it"""
+
+    async def __aenter__(self):
+        return http_client.get_client()
+
+    async def __aexit__(self, *exc):
+        return False
+
+
+async def main():
+    args = parse_args()
+    server = StubServer(args.connect_delay, args.latency)
+    server.start()
+    base = f"http://127.0.0.1:{server.port}"
+    search_engine.DDG_API_URL = f"{base}/ddg"
+    search_engine.DDG_HTML_URL = f"{base}/html"
+    search_engine.WIKI_API_URL = f"{base}/w/api.php"
+    engine = SearchEngine()
+
+    setups = {
+        'client per search': lambda: http_client.new_client(),
+        'pooled client': _Shared,
+    }
+    print(f"{args.searches} searches, {args.concurrency} at a time, "
+          f"{args.connect_delay * 1000:.0f} ms per new connection, HTTP/2 {'on' if http_client.HTTP2 else 'off'}")
+    print(f"  {'setup':<18} {'p50 ms':>8} {'p99 ms':>8} {'total s':>8} {'connections':>12} {'requests':>9}")
+    for name, client_for in setups.items():
+        connections, requests = server.connections, server.requests
+        start = time.perf_counter()
+        async with http_client.pooled_client():
+            latencies = await run_searches(engine, client_for, args.searches, args.concurrency)
+        total = time.perf_counter() - start
+        n = len(latencies)
+        print(f"  {name:<18} {latencies[n // 2]:>8.1f} {latencies[int(n * 0.99)]:>8.1f} {total:>8.2f}"
+              f" {server.connections - connections:>12} {server.requests - requests:>9}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,99 @@
+"""
+Benchmark of the saved-research index (research_index.ResearchIndex) at scale.
+
+Writes --notes made-up research files in the save_research format to a temporary
+directory, then measures:
+
+    first sync       indexing every file (once, the first time the index is used)
+    reopen + sync    opening the index again and syncing when nothing changed
+                     (what each start of the agent pays)
+    add_file         indexing one newly saved note
+    search           BM25 queries of 1-3 topic words (p50/p99 ms)
+
+Usage:
+    python benchmarks/bench_research_index.py [--notes 20000] [--queries 500]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from research_index import ResearchIndex
+
+SUBJECTS = ("quantum computing machine learning climate change photosynthesis blockchain renaissance "
+            "art volcano formation black holes vaccines jazz history roman empire neural networks "
+            "ocean currents plate tectonics cryptography antibiotics solar power gene editing "
+            "dinosaurs internet protocols coffee cultivation").split()
+FILLER = ("the study shows that results vary widely across regions and periods while experts agree on "
+          "several key findings including early evidence later work and open questions for research").split()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--notes', type=int, default=20_000, help="saved research files")
+    parser.add_argument('--queries', type=int, default=500, help="search queries")
+    parser.add_argument('--seed', type=int, default=0)
+    return parser.parse_args()
+
+
+def write_notes(directory: str, count: int, rng: random.Random):
+    for i in range(count):
+        subjects = rng.sample(SUBJECTS, 3)
+        topic = " ".join(subjects).title()
+        # Mostly about its own topic, with the odd mention of another
+        words = [rng.choice(subjects if rng.random() < 0.95 else SUBJECTS) if rng.random() < 0.2
+                 else rng.choice(FILLER) for _ in range(rng.randint(150, 400))]
+        with open(os.path.join(directory, f"research_note_{i}.txt"), "w", encoding="utf-8") as f:
+            f.write(f"Research Topic: {topic}\nDate: 2025-01-01 12:00:00\n" + "=" * 70 + "\n\n")
+            f.write(" ".join(words) + ".")
+            f.write("\n\n" + "=" * 70 + "\nSaved: 2025-01-01 12:00:00")
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+    rng = random.Random(args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        write_notes(directory, args.notes, rng)
+        index_path = os.path.join(directory, "research_index.db")
+
+        index = ResearchIndex(index_path)
+        indexed, seconds = timed(index.sync, directory)
+        print(f"first sync:      {indexed:,} notes in {seconds:.2f}s, "
+              f"index {os.path.getsize(index_path) / 2**20:.1f} MB")
+        index.close()
+
+        start = time.perf_counter()
+        index = ResearchIndex(index_path)
+        indexed = index.sync(directory)
+        print(f"reopen + sync:   {(time.perf_counter() - start) * 1000:.1f} ms ({indexed} notes re-read)")
+
+        write_notes_path = os.path.join(directory, "research_new_note.txt")
+        with open(write_notes_path, "w", encoding="utf-8") as f:
+            f.write("Research Topic: Bench\n" + "=" * 70 + "\n\nA freshly saved note about quantum cryptography.")
+        _, seconds = timed(index.add_file, write_notes_path)
+        print(f"add_file:        {seconds * 1000:.2f} ms")
+
+        latencies = []
+        for _ in range(args.queries):
+            query = " ".join(rng.sample(SUBJECTS, rng.randint(1, 3)))
+            _, seconds = timed(index.search, query)
+            latencies.append(seconds * 1000)
+        latencies.sort()
+        n = len(latencies)
+        print(f"search:          p50 {latencies[n // 2]:.2f} ms, p99 {latencies[int(n * 0.99)]:.2f} ms "
+              f"over {len(index):,} notes")
+        index.close()
+
+
+if __name__ == '__main__':
+    main()
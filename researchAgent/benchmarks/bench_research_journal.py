@@ -0,0 +1,108 @@
+"""
+Benchmark of saving research in bursts: a .txt file per save written on the event
+loop (how save_research used to work) against the ResearchJournal, each save then
+indexed for search_saved_research from a worker thread as save_research does.
+
+--saves notes are saved at once while a ticker task measures how late the event
+loop runs it (the stall other tool calls would see). It prints the time for the
+whole burst, the worst and p99 ticker delay, and how many fsyncs the journal did.
+
+Usage:
+    python benchmarks/bench_research_journal.py [--saves 500] [--size 4000] [--no-fsync]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ResearchNote
+from research_index import ResearchIndex
+from research_journal import ResearchJournal, read_notes
+
+TICK = 0.001
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--saves', type=int, default=500, help="notes saved at once")
+    parser.add_argument('--size', type=int, default=4000, help="characters per note")
+    parser.add_argument('--no-fsync', action='store_true', help="don't fsync (neither setup)")
+    return parser.parse_args()
+
+
+async def save_file(directory: str, note: ResearchNote, i: int, fsync: bool):
+    """The old save_research: a file per note, written on the event loop"""
+    with open(os.path.join(directory, f"research_{note.topic}_{i}.txt"), "w", encoding="utf-8") as f:
+        f.write(f"Research Topic: {note.topic}\nDate: {note.timestamp}\n" + "=" * 70 + "\n\n")
+        f.write(note.content)
+        if fsync:
+            f.flush()
+            os.fsync(f.fileno())
+
+
+async def measure(save_all) -> tuple:
+    """(seconds for save_all, sorted ticker delays in ms)"""
+    delays = []
+    done = False
+
+    async def ticker():
+        while not done:
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            delays.append((time.perf_counter() - start - TICK) * 1000)
+
+    ticking = asyncio.ensure_future(ticker())
+    await asyncio.sleep(0.01)
+    start = time.perf_counter()
+    await save_all()
+    seconds = time.perf_counter() - start
+    done = True
+    await ticking
+    return seconds, sorted(delays)
+
+
+async def main():
+    args = parse_args()
+    fsync = not args.no_fsync
+    notes = [ResearchNote(topic=f"topic{i}", content="research finding " * (args.size // 17))
+             for i in range(args.saves)]
+    print(f"{args.saves} saves of ~{args.size} characters at once, fsync {'on' if fsync else 'off'}")
+    print(f"  {'setup':<22} {'total s':>8} {'max stall ms':>13} {'p99 stall ms':>13} {'fsyncs':>7}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        async def save_files():
+            await asyncio.gather(*(save_file(directory, note, i, fsync) for i, note in enumerate(notes)))
+
+        seconds, delays = await measure(save_files)
+        print(f"  {'file per save':<22} {seconds:>8.2f} {delays[-1]:>13.1f} {delays[int(len(delays) * 0.99)]:>13.1f}"
+              f" {len(notes) if fsync else 0:>7}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        journal = ResearchJournal(os.path.join(directory, "journal"), fsync=fsync)
+        index = ResearchIndex(os.path.join(directory, "research_index.db"))
+
+        async def save(note: ResearchNote):
+            path, _ = await journal.append(note)
+            await asyncio.to_thread(index.sync_journal, [path])
+
+        async def save_journal():
+            await asyncio.gather(*(save(note) for note in notes))
+
+        seconds, delays = await measure(save_journal)
+        await journal.close()
+        indexed = len(index)
+        index.close()
+        print(f"  {'journal + index':<22} {seconds:>8.2f} {delays[-1]:>13.1f} {delays[int(len(delays) * 0.99)]:>13.1f}"
+              f" {journal.batches_written if fsync else 0:>7}")
+
+        start = time.perf_counter()
+        loaded = sum(1 for _ in read_notes(journal.directory))
+        print(f"  bulk load: {loaded} notes in {(time.perf_counter() - start) * 1000:.1f} ms ({indexed} indexed)")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,66 @@
+import importlib.util
+import os
+from contextlib import asynccontextmanager
+from typing import Optional
+
+import httpx
+
+USER_AGENT = "ResearchAgent/1.0 (Educational Project; Python/httpx)"
+
+# HTTP/2 needs the optional h2 package (pip install "httpx[http2]"); without it we speak HTTP/1.1
+HTTP2 = importlib.util.find_spec("h2") is not None and os.getenv("RESEARCH_HTTP2", "1") != "0"
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def limits_from_env() -> httpx.Limits:
+    """Connection pool limits, from RESEARCH_MAX_CONNECTIONS / _MAX_KEEPALIVE / _KEEPALIVE_EXPIRY"""
+    return httpx.Limits(
+        max_connections=int(os.getenv("RESEARCH_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("RESEARCH_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("RESEARCH_KEEPALIVE_EXPIRY", "60")),
+    )
+
+
+def new_client(**kwargs) -> httpx.AsyncClient:
+    """A client set up the way the research tools use it (kwargs override the defaults)"""
+    options = dict(
+        follow_redirects=True,
+        timeout=15.0,
+        headers={"User-Agent": USER_AGENT},
+        http2=HTTP2,
+        limits=limits_from_env(),
+    )
+    options.update(kwargs)
+    return httpx.AsyncClient(**options)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    The process-wide client, created on first use.
+
+    Its connections to DuckDuckGo and Wikipedia stay open between searches, so only
+    the first search to a host pays for DNS, TCP and TLS. Close it with close_client
+    (or run inside pooled_client) before the event loop ends.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = new_client()
+    return _client
+
+
+async def close_client():
+    """Close the process-wide client and its connections, if open"""
+    global _client
+    client, _client = _client, None
+    if client is not None:
+        await client.aclose()
+
+
+@asynccontextmanager
+async def pooled_client():
+    """Open the process-wide client for the duration of the block, e.g. the agent's session"""
+    try:
+        yield get_client()
+    finally:
+        await close_client()
@@ -2,8 +2,10 @@ from pydantic_ai import Agent
 import asyncio
 import logfire
 from dotenv import load_dotenv
+import threading
 import time
-from tools import web_search, save_research, get_date_time
+from tools import web_search, save_research, search_saved_research, get_date_time, search_engine, research_journal
+from http_client import pooled_client
 
 # Load environment variables
 load_dotenv(override=True)
@@ -23,13 +25,16 @@ agent = Agent(
     Your capabilities:
     - 🔍 Search the web for current information, facts, and research
     - 💾 Save research findings to files for later reference
+    - 📚 Search research saved earlier
     - 📅 Provide current date and time information
     
     When conducting research:
-    1. Use web_search to find information on topics you need to research
-    2. Synthesize information from multiple searches if needed
-    3. Provide clear, well-organized summaries with key findings
-    4. Cite sources when available
+    1. If the topic may have been researched before, first use search_saved_research;
+       if the saved findings answer the question, use them (and say they were saved earlier)
+    2. Otherwise use web_search to find information on topics you need to research
+    3. Synthesize information from multiple searches if needed
+    4. Provide clear, well-organized summaries with key findings
+    5. Cite sources when available
     
     CRITICAL - When saving research:
     - ONLY call save_research when user explicitly says "save", "store", "keep", or "write to file"
@@ -46,12 +51,53 @@ agent = Agent(
     
     Always be thorough, accurate, and cite your sources when possible.
     """,
-    tools=[web_search, save_research, get_date_time]
+    tools=[web_search, search_saved_research, save_research, get_date_time]
 )
 
 time.sleep(1)
 
 
+def print_cache_stats():
+    """Print web search cache hits/misses for this session"""
+    stats = search_engine.stats()
+    if "entries" not in stats:
+        print("\n📦 Search cache is off (RESEARCH_CACHE_PATH is empty)\n")
+        return
+    print(f"\n📦 Search cache: {stats['entries']} entries, "
+          f"{stats['hits']} hits, {stats['stale_hits']} stale hits (refreshed: {stats['refreshes']}), "
+          f"{stats['misses']} misses, hit rate {stats['hit_rate']:.0%}, "
+          f"{stats['coalesced']} searches joined one already running\n")
+
+
+def _settle(future: asyncio.Future, line, error):
+    if not future.done():
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(line)
+
+
+def _read_line(loop: asyncio.AbstractEventLoop, future: asyncio.Future, prompt: str):
+    try:
+        line = input(prompt)
+    except BaseException as e:
+        loop.call_soon_threadsafe(_settle, future, None, e)
+    else:
+        loop.call_soon_threadsafe(_settle, future, line, None)
+
+
+async def read_input(prompt: str) -> str:
+    """
+    input(prompt) read on a daemon thread, so background cache refreshes keep running
+    meanwhile. Unlike the default executor, nothing waits for that thread on exit,
+    so Ctrl-C ends the session even while input is blocked on the terminal.
+    """
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    threading.Thread(target=_read_line, args=(loop, future, prompt), daemon=True).start()
+    return await future
+
+
 async def main():
     """Main function to run the research agent"""
     message_history = []  # Initialize empty message history
@@ -63,35 +109,48 @@ async def main():
     print("\nAvailable capabilities:")
     print("  🔍 Web search for information and facts")
     print("  💾 Save research findings to files")
+    print("  📚 Search research saved earlier")
     print("  📅 Get current date and time")
-    print("\nType 'exit', 'quit', or 'bye' to end the session.")
+    print("\nType '/cache' for search cache stats.")
+    print("Type 'exit', 'quit', or 'bye' to end the session.")
     print("=" * 70)
     print()
 
-    while True:
+    # One pooled HTTP client for every search this session; closed on the way out
+    async with pooled_client():
         try:
-            message = input("You: ")
+            while True:
+                try:
+                    message = await read_input("You: ")
             
-            if message.lower() in ["exit", "quit", "bye"]:
-                print("\n👋 Goodbye! Happy researching!")
-                break
+                    if message.lower() in ["exit", "quit", "bye"]:
+                        print("\n👋 Goodbye! Happy researching!")
+                        break
             
-            if not message.strip():
-                continue
+                    if not message.strip():
+                        continue
+
+                    if message.strip().lower() == "/cache":
+                        print_cache_stats()
+                        continue
 
-            # Run agent with message history for context
-            response = await agent.run(message, message_history=message_history)
-            print(f"\n🤖 Agent:\n{response.output}\n")
+                    # Run agent with message history for context
+                    response = await agent.run(message, message_history=message_history)
+                    print(f"\n🤖 Agent:\n{response.output}\n")
 
-            # Update message history to maintain conversation context
-            message_history = response.all_messages()
+                    # Update message history to maintain conversation context
+                    message_history = response.all_messages()
             
-        except KeyboardInterrupt:
-            print("\n\n👋 Goodbye! Happy researching!")
-            break
-        except Exception as e:
-            print(f"\n❌ Error: {str(e)}\n")
-            logfire.error(f"Error in main loop: {str(e)}")
+                except (KeyboardInterrupt, asyncio.CancelledError, EOFError):
+                    # Ctrl-C cancels whatever was awaited (asyncio.run turns SIGINT into a cancel)
+                    print("\n\n👋 Goodbye! Happy researching!")
+                    break
+                except Exception as e:
+                    print(f"\n❌ Error: {str(e)}\n")
+                    logfire.error(f"Error in main loop: {str(e)}")
+        finally:
+            # Saves still being written go to disk before we exit
+            await research_journal.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,189 @@
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from models import ResearchNote, SearchResult
+
+_WORDS = re.compile(r"\w+")
+# Words that would match nearly every note
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it its of on or that the this to was "
+    "were what when where which who why will with about do does did me my you your".split()
+)
+# Weight of a match in the topic relative to one in the content, for BM25
+TOPIC_WEIGHT = 3.0
+
+
+def parse_research_file(text: str) -> Tuple[str, str, Optional[str]]:
+    """(topic, content, date) of a file written by save_research"""
+    topic, date = "", None
+    head, _, body = text.partition("=" * 70 + "\n\n")
+    for line in head.splitlines():
+        if line.startswith("Research Topic: "):
+            topic = line[len("Research Topic: "):].strip()
+        elif line.startswith("Date: "):
+            date = line[len("Date: "):].strip()
+    if not body:
+        return topic, text, date
+    content = body.rsplit("\n\n" + "=" * 70, 1)[0]
+    return topic, content, date
+
+
+def _match_query(query: str, every_word: bool) -> Optional[str]:
+    """FTS5 query for the words of query (all of them, or any), or None if it has none worth searching"""
+    words = [word for word in dict.fromkeys(_WORDS.findall(query.lower())) if word not in STOPWORDS]
+    if not words:
+        return None
+    return (" AND " if every_word else " OR ").join(f'"{word}"' for word in words)
+
+
+class ResearchIndex:
+    """
+    Full-text index of saved research, ranked by BM25 (SQLite FTS5).
+
+    The index lives on disk and is only ever added to, so opening it reads nothing.
+    sync_journal indexes the notes appended to the research journal since it last
+    ran, reading from where it stopped in each segment. sync does the same for the
+    research files older versions saved one per note: it indexes only files it
+    hasn't seen or that changed since, judged by size and modification time.
+
+    Everything here can be rebuilt from the notes, so commits aren't fsynced. The
+    index may be used from several threads (so syncing can run off the event loop);
+    they take turns with its connection.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS notes USING fts5("
+            "topic, content, source UNINDEXED, saved_at UNINDEXED, tokenize='porter unicode61')"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS indexed_files ("
+            "path TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime REAL NOT NULL, note INTEGER NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS journal_offsets (path TEXT PRIMARY KEY, offset INTEGER NOT NULL)"
+        )
+
+    def add(self, topic: str, content: str, source: str, saved_at: Optional[str] = None) -> int:
+        """Index a note; returns its id"""
+        saved_at = saved_at or datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        with self._lock:
+            cursor = self._db.execute(
+                "INSERT INTO notes (topic, content, source, saved_at) VALUES (?, ?, ?, ?)",
+                (topic, content, source, saved_at),
+            )
+            return cursor.lastrowid
+
+    def add_file(self, path: str) -> int:
+        """Index (or re-index) a file written by save_research; returns its note's id"""
+        with self._transaction():
+            return self._add_file(path, os.stat(path))
+
+    def sync(self, directory: str) -> int:
+        """Index research files in directory that are new or changed; returns how many"""
+        if not os.path.isdir(directory):
+            return 0
+        indexed = 0
+        with self._transaction(), os.scandir(directory) as entries:
+            known = {path: (size, mtime) for path, size, mtime in
+                     self._db.execute("SELECT path, size, mtime FROM indexed_files")}
+            for entry in entries:
+                if not (entry.name.startswith("research_") and entry.name.endswith(".txt")):
+                    continue
+                path = os.path.join(directory, entry.name)
+                stat = entry.stat()
+                if known.get(path) != (stat.st_size, stat.st_mtime):
+                    self._add_file(path, stat)
+                    indexed += 1
+        return indexed
+
+    def sync_journal(self, segments: List[str]) -> int:
+        """Index the notes added to these journal segments since the last sync; returns how many"""
+        indexed = 0
+        with self._transaction():
+            for path in segments:
+                row = self._db.execute("SELECT offset FROM journal_offsets WHERE path = ?", (path,)).fetchone()
+                offset = row[0] if row else 0
+                with open(path, "rb") as f:
+                    f.seek(offset)
+                    new = f.read()
+                # Leave a line still being written for next time
+                new = new[:new.rfind(b"\n") + 1]
+                for line in new.splitlines(keepends=True):
+                    try:
+                        note = ResearchNote.model_validate_json(line)
+                    except ValueError:
+                        note = None  # damaged line: skip it rather than stop indexing here for good
+                    if note is not None:
+                        self.add(note.topic, note.content, f"{path}#{offset}",
+                                 note.timestamp.strftime("%Y-%m-%d %H:%M:%S"))
+                        indexed += 1
+                    offset += len(line)
+                self._db.execute(
+                    "INSERT OR REPLACE INTO journal_offsets (path, offset) VALUES (?, ?)", (path, offset)
+                )
+        return indexed
+
+    def _add_file(self, path: str, stat: os.stat_result) -> int:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            topic, content, date = parse_research_file(f.read())
+        old = self._db.execute("SELECT note FROM indexed_files WHERE path = ?", (path,)).fetchone()
+        if old is not None:
+            self._db.execute("DELETE FROM notes WHERE rowid = ?", old)
+        note = self.add(topic or os.path.basename(path), content, path, date)
+        self._db.execute(
+            "INSERT OR REPLACE INTO indexed_files (path, size, mtime, note) VALUES (?, ?, ?, ?)",
+            (path, stat.st_size, stat.st_mtime, note),
+        )
+        return note
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                yield
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def search(self, query: str, limit: int = 3) -> List[SearchResult]:
+        """
+        Notes matching query, best (by BM25) first: those with every word of the query
+        if there are any, otherwise those with some of them. Each result's title is the
+        topic and date, its snippet the note's content and its url where it was saved.
+        """
+        rows = []
+        for every_word in (True, False):
+            match = _match_query(query, every_word)
+            if match is None:
+                return []
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT topic, saved_at, content, source FROM notes WHERE notes MATCH ? "
+                    "ORDER BY bm25(notes, ?, 1.0) LIMIT ?",
+                    (match, TOPIC_WEIGHT, limit),
+                ).fetchall()
+            if rows:
+                break
+        return [SearchResult(title=f"{topic} (saved {saved_at})", snippet=content, url=source)
+                for topic, saved_at, content, source in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import re
+from typing import Iterator, List, Optional, Tuple
+
+from models import ResearchNote
+
+_SEGMENT = re.compile(r"^research-(\d{6})\.jsonl$")
+
+
+def segment_paths(directory: str) -> List[str]:
+    """The journal's segment files in directory, oldest first"""
+    if not os.path.isdir(directory):
+        return []
+    names = sorted(name for name in os.listdir(directory) if _SEGMENT.match(name))
+    return [os.path.join(directory, name) for name in names]
+
+
+def read_notes(directory: str) -> Iterator[Tuple[str, int, ResearchNote]]:
+    """(segment, offset, note) for every note in the journal, oldest first"""
+    for path in segment_paths(directory):
+        with open(path, "rb") as f:
+            offset = 0
+            for line in f:
+                # A line cut short by a crash has no newline; it was never acknowledged
+                if line.endswith(b"\n"):
+                    yield path, offset, ResearchNote.model_validate_json(line)
+                offset += len(line)
+
+
+def _ends_cleanly(path: str) -> bool:
+    """Whether a segment is empty or ends with a whole line (not one cut short by a crash)"""
+    with open(path, "rb") as f:
+        if f.seek(0, os.SEEK_END) == 0:
+            return True
+        f.seek(-1, os.SEEK_END)
+        return f.read(1) == b"\n"
+
+
+class ResearchJournal:
+    """
+    Append-only JSONL journal of ResearchNotes, one note per line, in size-limited
+    segment files (research-000001.jsonl, research-000002.jsonl, ...).
+
+    Writes never block the event loop: append queues the note for a writer task,
+    which serializes and writes everything queued so far from a worker thread and
+    fsyncs once per batch (a burst of saves shares one fsync). append returns once
+    the note is on disk. A segment that would grow past max_bytes is closed and a new
+    one started.
+    """
+
+    def __init__(self, directory: str, max_bytes: int = 16 * 2**20, fsync: bool = True):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.fsync = fsync
+        self.notes_written = 0
+        self.batches_written = 0
+        self._file = None
+        self._path: Optional[str] = None
+        self._size = 0
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Future] = None
+
+    async def append(self, note: ResearchNote) -> Tuple[str, int]:
+        """Write note to the journal; returns (segment path, byte offset) of its line"""
+        if self._writer is None:
+            self._queue = asyncio.Queue()
+            self._writer = asyncio.ensure_future(self._write_queued())
+        written = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((note, written))
+        return await written
+
+    async def close(self):
+        """Finish writing what was queued and close the current segment"""
+        if self._writer is not None:
+            self._queue.put_nowait(None)
+            await self._writer
+            self._writer = self._queue = None
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+            self._file = None
+
+    async def _write_queued(self):
+        while True:
+            batch = [await self._queue.get()]
+            while not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            closing = batch[-1] is None
+            batch = [entry for entry in batch if entry is not None]
+            if batch:
+                try:
+                    locations = await asyncio.to_thread(self._write, [note for note, _ in batch])
+                except Exception as e:
+                    for _, written in batch:
+                        if not written.done():
+                            written.set_exception(e)
+                else:
+                    for (_, written), location in zip(batch, locations):
+                        # Whoever saved it may have stopped waiting; it's written regardless
+                        if not written.done():
+                            written.set_result(location)
+            if closing:
+                return
+
+    def _write(self, notes: List[ResearchNote]) -> List[Tuple[str, int]]:
+        # Runs in a worker thread, one batch at a time
+        locations = []
+        pending = []
+        for note in notes:
+            line = (note.model_dump_json() + "\n").encode()
+            if self._file is None:
+                self._resume()
+            if self._size and self._size + len(line) > self.max_bytes:
+                self._flush(pending)
+                pending = []
+                self._file.close()
+                self._open(self._next_segment(self._path))
+            locations.append((self._path, self._size))
+            pending.append(line)
+            self._size += len(line)
+        self._flush(pending)
+        self.notes_written += len(notes)
+        self.batches_written += 1
+        return locations
+
+    def _flush(self, lines: List[bytes]):
+        if self._file is None or not lines:
+            return
+        self._file.write(b"".join(lines))
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _resume(self):
+        """Open the newest segment to continue it (unless a crash cut its last line short)"""
+        os.makedirs(self.directory, exist_ok=True)
+        segments = segment_paths(self.directory)
+        if segments and _ends_cleanly(segments[-1]):
+            self._open(segments[-1])
+        else:
+            self._open(self._next_segment(segments[-1] if segments else None))
+
+    def _next_segment(self, path: Optional[str]) -> str:
+        number = int(_SEGMENT.match(os.path.basename(path)).group(1)) if path else 0
+        return os.path.join(self.directory, f"research-{number + 1:06d}.jsonl")
+
+    def _open(self, path: str):
+        self._file = open(path, "ab")
+        self._path = path
+        self._size = self._file.seek(0, os.SEEK_END)
@@ -0,0 +1,119 @@
+import json
+import sqlite3
+import time
+from typing import Dict, List, Optional, Tuple
+
+from models import SearchResult
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+# How long each source's results stay fresh. Encyclopedia pages change slowly; web results faster.
+DEFAULT_TTLS = {
+    "ddg_instant_answer": DAY,
+    "wikipedia_opensearch": 7 * DAY,
+    "wikipedia_extract": 7 * DAY,
+    "ddg_html": 6 * HOUR,
+}
+
+
+def normalize_query(query: str) -> str:
+    """Cache key for a query: case, surrounding punctuation and extra whitespace don't matter"""
+    return " ".join(query.lower().split()).strip(".!?")
+
+
+class SearchCache:
+    """
+    SQLite cache of each search source's results, keyed by source and normalized query,
+    so repeated searches skip the network within and across sessions.
+
+    Results are fresh for their source's TTL. After that they are stale: still returned
+    (the caller refreshes them in the background) for stale_for more seconds, then
+    dropped. Beyond max_entries the least recently used results are evicted.
+    """
+
+    def __init__(self, path: str, ttls: Dict[str, float] = None, default_ttl: float = DAY,
+                 stale_for: float = 7 * DAY, max_entries: int = 20_000):
+        self.path = path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.default_ttl = default_ttl
+        self.stale_for = stale_for
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS search_results ("
+            "source TEXT NOT NULL, query TEXT NOT NULL, results TEXT NOT NULL, "
+            "stored_at REAL NOT NULL, used_at REAL NOT NULL, PRIMARY KEY (source, query))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS search_results_used ON search_results (used_at)")
+
+    def ttl(self, source: str) -> float:
+        return self.ttls.get(source, self.default_ttl)
+
+    def get(self, source: str, query: str) -> Optional[Tuple[List[SearchResult], bool]]:
+        """(results, whether they are still fresh) cached for source and query, or None"""
+        key = normalize_query(query)
+        row = self._db.execute(
+            "SELECT results, stored_at FROM search_results WHERE source = ? AND query = ?", (source, key)
+        ).fetchone()
+        now = time.time()
+        results = None
+        if row is not None and now - row[1] <= self.ttl(source) + self.stale_for:
+            try:
+                results = [SearchResult.model_validate(result) for result in json.loads(row[0])]
+            except ValueError:
+                results = None  # stored by a version that cached something else: a miss, replaced on put
+        if results is None:
+            if row is not None:
+                self._db.execute("DELETE FROM search_results WHERE source = ? AND query = ?", (source, key))
+            self.misses += 1
+            return None
+        self._db.execute(
+            "UPDATE search_results SET used_at = ? WHERE source = ? AND query = ?", (now, source, key)
+        )
+        fresh = now - row[1] <= self.ttl(source)
+        if fresh:
+            self.hits += 1
+        else:
+            self.stale_hits += 1
+        return results, fresh
+
+    def put(self, source: str, query: str, results: List[SearchResult]):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO search_results (source, query, results, stored_at, used_at) "
+            "VALUES (?, ?, ?, ?, ?)",
+            (source, normalize_query(query), json.dumps([result.model_dump() for result in results]), now, now),
+        )
+        overflow = len(self) - self.max_entries
+        if overflow > 0:
+            self._db.execute(
+                "DELETE FROM search_results WHERE rowid IN "
+                "(SELECT rowid FROM search_results ORDER BY used_at LIMIT ?)",
+                (overflow,),
+            )
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM search_results").fetchone()[0]
+
+    @property
+    def hit_rate(self) -> float:
+        """Share of lookups answered from the cache, fresh or stale"""
+        total = self.hits + self.stale_hits + self.misses
+        return (self.hits + self.stale_hits) / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+    def close(self):
+        self._db.close()
@@ -0,0 +1,290 @@
+import asyncio
+import html
+import re
+from typing import Callable, Dict, List, Optional
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import httpx
+
+from models import SearchResult
+from search_cache import SearchCache, normalize_query
+from search_results import merge_results
+
+DDG_API_URL = "https://api.duckduckgo.com/"
+DDG_HTML_URL = "https://html.duckduckgo.com/html/"
+WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+
+
+class SearchSession:
+    """
+    The requests made for one search, shared between its sources.
+
+    Identical GETs (same URL and params) are only sent once: a source asking for
+    something another source already asked for awaits the same request, e.g. the
+    Wikipedia OpenSearch call both Wikipedia sources need.
+    """
+
+    def __init__(self, client: httpx.AsyncClient):
+        self.client = client
+        self._requests: Dict[tuple, asyncio.Future] = {}
+
+    async def get(self, url: str, params: dict, **kwargs) -> httpx.Response:
+        """The 200 response to GET url?params; raises httpx.HTTPError if it failed"""
+        key = (url, tuple(sorted(params.items())))
+        request = self._requests.get(key)
+        if request is None:
+            request = self._requests[key] = asyncio.ensure_future(self._get(url, params, **kwargs))
+        # shield: one source being cancelled mustn't cancel the request for the others
+        return await asyncio.shield(request)
+
+    async def get_json(self, url: str, params: dict, **kwargs):
+        response = await self.get(url, params, **kwargs)
+        return response.json()
+
+    def close(self):
+        """Cancel requests still in flight"""
+        for request in self._requests.values():
+            request.cancel()
+
+    async def _get(self, url: str, params: dict, **kwargs) -> httpx.Response:
+        response = await self.client.get(url, params=params, **kwargs)
+        response.raise_for_status()
+        return response
+
+
+def _opensearch_params(query: str) -> dict:
+    return {"action": "opensearch", "search": query, "limit": 5, "namespace": 0, "format": "json"}
+
+
+def _title_from_url(url: str) -> str:
+    """"Python (programming language)" from https://duckduckgo.com/Python_(programming_language)"""
+    return unquote(urlsplit(url).path.rstrip("/").rsplit("/", 1)[-1]).replace("_", " ")
+
+
+async def ddg_instant_answer(session: SearchSession, query: str) -> List[SearchResult]:
+    """DuckDuckGo Instant Answer: the abstract, or failing that up to 5 related topics"""
+    ddg_data = await session.get_json(
+        DDG_API_URL, {"q": query, "format": "json", "no_html": 1, "skip_disambig": 1}
+    )
+    if not ddg_data:
+        return []
+
+    abstract = ddg_data.get("Abstract", "")
+    if abstract:
+        return [SearchResult(title=ddg_data.get("Heading") or query, snippet=abstract,
+                             url=ddg_data.get("AbstractURL") or None)]
+
+    # No abstract: use the related topics, flattening nested groups of topics
+    results = []
+    for topic in ddg_data.get("RelatedTopics", [])[:5]:
+        if not isinstance(topic, dict):
+            continue
+        for subtopic in [topic] if "Text" in topic else topic.get("Topics", [])[:3]:
+            if isinstance(subtopic, dict) and subtopic.get("Text"):
+                url = subtopic.get("FirstURL") or None
+                title = _title_from_url(url) if url else subtopic["Text"].split(" - ", 1)[0]
+                results.append(SearchResult(title=title, snippet=subtopic["Text"], url=url))
+        if len(results) >= 5:
+            break
+    return results[:5]
+
+
+async def wikipedia_opensearch(session: SearchSession, query: str) -> List[SearchResult]:
+    """Wikipedia OpenSearch titles that come with a description"""
+    wiki_data = await session.get_json(WIKI_API_URL, _opensearch_params(query))
+    if not wiki_data or len(wiki_data) < 4 or not wiki_data[1]:
+        return []
+    titles, descriptions, urls = wiki_data[1], wiki_data[2], wiki_data[3]
+    return [
+        SearchResult(title=title, snippet=description, url=url or None)
+        for title, description, url in zip(titles[:3], descriptions, urls)
+        if title and description
+    ]
+
+
+async def wikipedia_extract(session: SearchSession, query: str) -> List[SearchResult]:
+    """Intro of the Wikipedia page OpenSearch ranks first (or titled like the query)"""
+    search_term = query
+    try:
+        search_data = await session.get_json(WIKI_API_URL, _opensearch_params(query))
+    except (httpx.HTTPError, ValueError):
+        search_data = None  # look the query up as a title
+    if search_data and len(search_data) >= 2 and search_data[1]:
+        # Use the first search result title
+        search_term = search_data[1][0]
+
+    extract_data = await session.get_json(WIKI_API_URL, {
+        "action": "query",
+        "format": "json",
+        "prop": "extracts|info",
+        "exintro": True,
+        "explaintext": True,
+        "inprop": "url",
+        "titles": search_term,
+        "redirects": 1
+    })
+    if not extract_data:
+        return []
+    results = []
+    pages = extract_data.get("query", {}).get("pages", {})
+    for page_id, page in pages.items():
+        extract = page.get("extract", "").strip()
+        if page_id != "-1" and len(extract) > 50:  # Only if meaningful content
+            title = page.get("title", "")
+            url = page.get("fullurl", f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}")
+            results.append(SearchResult(title=title, snippet=extract, url=url))
+    return results
+
+
+_HTML_RESULT = re.compile(
+    r'<a[^>]*class="result__a"[^>]*href="([^"]*)"[^>]*>(.*?)</a>.*?<a[^>]*class="result__snippet"[^>]*>(.*?)</a>',
+    re.DOTALL,
+)
+
+
+def _html_text(fragment: str) -> str:
+    return html.unescape(re.sub(r"<[^>]+>", "", fragment)).strip()
+
+
+async def ddg_html(session: SearchSession, query: str) -> List[SearchResult]:
+    """Results scraped from DuckDuckGo's HTML results page"""
+    response = await session.get(
+        DDG_HTML_URL,
+        {"q": query},
+        headers={"User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"},
+        timeout=10.0,
+    )
+    results = []
+    for href, title, snippet in _HTML_RESULT.findall(response.text)[:5]:
+        # Links go through DuckDuckGo's redirect (//duckduckgo.com/l/?uddg=<url>)
+        href = html.unescape(href)
+        url = parse_qs(urlsplit(href).query).get("uddg", [href])[0]
+        if url.startswith("//"):
+            url = "https:" + url
+        title, snippet = _html_text(title), _html_text(snippet)
+        if title and snippet:
+            results.append(SearchResult(title=title, snippet=snippet, url=url or None))
+    return results
+
+
+# Best source first: results are shown in this order
+DEFAULT_SOURCES = [ddg_instant_answer, wikipedia_opensearch, wikipedia_extract, ddg_html]
+
+
+class SearchEngine:
+    """
+    Queries every search source at once and returns as soon as there are enough results.
+
+    Sources are ranked (best first). The search is done once the best-ranked sources
+    that have answered - with no better-ranked source still outstanding - include at
+    least min_sources with results; the sources still running are cancelled. So a
+    search takes as long as the slowest source it actually needs, not the sum of all
+    of them, and returns what the best sources found rather than whatever came first.
+    If that never happens, it returns whatever it has after timeout seconds.
+
+    With a cache, sources answer from it when they can. Stale results are used as they
+    are and refreshed in the background for next time. Identical searches (by normalized
+    query) made while one is running wait for its results instead of searching again.
+    """
+
+    def __init__(self, sources: List[Callable] = None, min_sources: int = 1, timeout: float = 15.0,
+                 cache: Optional[SearchCache] = None):
+        self.sources = list(sources or DEFAULT_SOURCES)
+        self.min_sources = min_sources
+        self.timeout = timeout
+        self.cache = cache
+        self.coalesced = 0
+        self.refreshes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Dict[tuple, asyncio.Future] = {}
+
+    async def search(self, client: httpx.AsyncClient, query: str) -> List[SearchResult]:
+        """Results of the sources needed, deduplicated, best first (see search_results.merge_results)"""
+        key = normalize_query(query)
+        search = self._inflight.get(key)
+        if search is None:
+            search = self._inflight[key] = asyncio.ensure_future(self._search(client, query))
+            search.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: one caller giving up mustn't cancel the search for the others
+        return list(await asyncio.shield(search))
+
+    async def _search(self, client: httpx.AsyncClient, query: str) -> List[SearchResult]:
+        session = SearchSession(client)
+        refresh_session = None
+        results: List[Optional[List[SearchResult]]] = [None] * len(self.sources)
+        tasks = {}
+        for i, source in enumerate(self.sources):
+            cached = self.cache.get(source.__name__, query) if self.cache is not None else None
+            if cached is None:
+                tasks[asyncio.ensure_future(self._fetch(source, session, query))] = i
+                continue
+            results[i], fresh = cached
+            if not fresh:
+                # Refreshes share requests with each other, but outlive this search
+                refresh_session = refresh_session or SearchSession(client)
+                self._refresh(source, refresh_session, query)
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        pending = set(tasks)
+        needed = self._sufficient(results)
+        try:
+            while pending and needed is None:
+                done, pending = await asyncio.wait(
+                    pending, timeout=deadline - loop.time(), return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    break
+                for task in done:
+                    # A failing source just has nothing to add
+                    results[tasks[task]] = [] if task.exception() else task.result()
+                needed = self._sufficient(results)
+        finally:
+            for task in pending:
+                task.cancel()
+            session.close()
+        if needed is not None:
+            results = results[:needed]
+        return merge_results([found or [] for found in results], query)
+
+    async def _fetch(self, source: Callable, session: SearchSession, query: str) -> List[SearchResult]:
+        results = await source(session, query)
+        # Only answers are cached: a source that failed raised instead
+        if self.cache is not None:
+            self.cache.put(source.__name__, query, results)
+        return results
+
+    def _refresh(self, source: Callable, session: SearchSession, query: str):
+        """Fetch source's results for query again in the background, unless that's already happening"""
+        key = (source.__name__, normalize_query(query))
+        if key in self._refreshing:
+            return
+        self.refreshes += 1
+        refresh = self._refreshing[key] = asyncio.ensure_future(self._fetch(source, session, query))
+
+        def done(_):
+            self._refreshing.pop(key, None)
+            # A failed refresh keeps the stale results; nothing to report
+            if not refresh.cancelled():
+                refresh.exception()
+
+        refresh.add_done_callback(done)
+
+    def stats(self) -> dict:
+        """Cache hits/misses (if there's a cache), coalesced searches and background refreshes"""
+        stats = self.cache.stats() if self.cache is not None else {}
+        stats.update(coalesced=self.coalesced, refreshes=self.refreshes)
+        return stats
+
+    def _sufficient(self, results: List[Optional[List[SearchResult]]]) -> Optional[int]:
+        """How many of the best-ranked sources make enough results, or None if not there yet"""
+        found = 0
+        for i, source_results in enumerate(results):
+            if source_results is None:
+                return None
+            found += bool(source_results)
+            if found >= self.min_sources:
+                return i + 1
+        return None
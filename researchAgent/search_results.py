@@ -0,0 +1,112 @@
+import re
+from typing import List, Sequence
+from urllib.parse import unquote, urlsplit
+
+from models import SearchResult
+
+_WORDS = re.compile(r"\w+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+# Ranking: how much matching the query, the source's rank and the place within the source count
+RELEVANCE_WEIGHT = 0.6
+SOURCE_WEIGHT = 0.25
+POSITION_WEIGHT = 0.15
+# Results are left out rather than shown with less snippet than this
+MIN_SNIPPET_TOKENS = 12
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token)"""
+    return (len(text) + 3) // 4
+
+
+def url_key(url: str) -> str:
+    """A URL with what doesn't change the page dropped: scheme, www./m., fragment, trailing slash, case of the host"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    for prefix in ("www.", "m."):
+        if host.startswith(prefix):
+            host = host[len(prefix):]
+    host = host.replace(".m.wikipedia.org", ".wikipedia.org")
+    path = unquote(parts.path).replace(" ", "_").rstrip("/")
+    return f"{host}{path}?{parts.query}" if parts.query else f"{host}{path}"
+
+
+def title_key(title: str) -> str:
+    return " ".join(_WORDS.findall(title.lower()))
+
+
+def merge_results(groups: Sequence[List[SearchResult]], query: str) -> List[SearchResult]:
+    """
+    Results of several sources (best source first) as one list, best result first.
+
+    Results with the same URL or title are the same result: the best-ranked copy is
+    kept, with the longest snippet any copy had and that copy's URL (e.g. a one-line
+    description of a Wikipedia page gives way to the page's intro). Results are ranked by how many of the
+    query's words they contain, then their source's rank and their place in it.
+    """
+    query_words = set(_WORDS.findall(query.lower()))
+    merged: List[SearchResult] = []
+    scores: List[float] = []
+    seen = {}
+    for source_rank, results in enumerate(groups):
+        for position, result in enumerate(results):
+            keys = [f"title:{title_key(result.title)}"]
+            if result.url:
+                keys.append(f"url:{url_key(result.url)}")
+            i = next((seen[key] for key in keys if key in seen), None)
+            if i is not None:
+                kept = merged[i]
+                if len(result.snippet) > len(kept.snippet):
+                    # Cite the page the snippet came from
+                    merged[i] = kept.model_copy(update={"snippet": result.snippet, "url": result.url or kept.url})
+                elif not kept.url and result.url:
+                    merged[i] = kept.model_copy(update={"url": result.url})
+            else:
+                i = len(merged)
+                merged.append(result)
+                text_words = set(_WORDS.findall(f"{result.title} {result.snippet}".lower()))
+                relevance = len(query_words & text_words) / len(query_words) if query_words else 0.0
+                scores.append(RELEVANCE_WEIGHT * relevance
+                              + SOURCE_WEIGHT / (1 + source_rank)
+                              + POSITION_WEIGHT / (1 + position))
+            for key in keys:
+                seen.setdefault(key, i)
+    order = sorted(range(len(merged)), key=lambda i: -scores[i])
+    return [merged[i] for i in order]
+
+
+def _shorten(text: str, max_tokens: int) -> str:
+    """text cut to about max_tokens, at the end of a sentence (or failing that a word) if possible"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max_tokens * 4]
+    sentences = [m.start() for m in _SENTENCE_END.finditer(cut)]
+    if sentences and sentences[-1] > len(cut) // 2:
+        return cut[:sentences[-1]]
+    return cut.rsplit(" ", 1)[0] + "..."
+
+
+def render_results(results: List[SearchResult], max_tokens: int = 500, max_results: int = 5) -> str:
+    """
+    Results as compact numbered text for the model, within about max_tokens.
+
+    The best max_results results that fit with at least a short snippet are shown,
+    and always the best one, even if that goes over the budget. Snippets share what's left of the budget after titles and URLs: short ones are
+    shown whole and the long ones split the rest evenly, cut at a sentence end.
+    """
+    results = results[:max_results]
+    headers = [f"[{n}] {result.title}" for n, result in enumerate(results, 1)]
+    footers = [f"\n{result.url}" if result.url else "" for result in results]
+    overheads = [estimate_tokens(header + footer) + 2 for header, footer in zip(headers, footers)]
+    while len(results) > 1 and sum(overheads) + MIN_SNIPPET_TOKENS * len(results) > max_tokens:
+        results, headers, footers, overheads = results[:-1], headers[:-1], footers[:-1], overheads[:-1]
+
+    available = max(max_tokens - sum(overheads), MIN_SNIPPET_TOKENS * len(results))
+    wanted = [estimate_tokens(result.snippet) for result in results]
+    allotted = [0] * len(results)
+    for k, i in enumerate(sorted(range(len(results)), key=lambda i: wanted[i])):
+        allotted[i] = min(wanted[i], available // (len(results) - k))
+        available -= allotted[i]
+    return "\n\n".join(f"{header}\n{_shorten(result.snippet, tokens)}{footer}"
+                       for header, footer, result, tokens in zip(headers, footers, results, allotted))
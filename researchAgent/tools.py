@@ -1,11 +1,75 @@
 from pydantic_ai import RunContext
-import httpx
+import asyncio
 import os
 from datetime import datetime
 import json
 import re
 
+from http_client import get_client
+from models import ResearchNote
+from research_index import ResearchIndex
+from research_journal import ResearchJournal, segment_paths
+from search_cache import SearchCache
+from search_engine import SearchEngine
+from search_results import render_results
 
+# Results cached per source across sessions; RESEARCH_CACHE_PATH="" turns the cache off
+cache_path = os.getenv("RESEARCH_CACHE_PATH", "search_cache.db")
+search_cache = SearchCache(
+    cache_path,
+    stale_for=float(os.getenv("RESEARCH_CACHE_STALE_FOR", str(7 * 24 * 60 * 60))),
+    max_entries=int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "20000")),
+) if cache_path else None
+
+# Answer from the best source that has results; raise min_sources to combine more of them
+search_engine = SearchEngine(min_sources=int(os.getenv("RESEARCH_MIN_SOURCES", "1")),
+                             timeout=float(os.getenv("RESEARCH_SEARCH_TIMEOUT", "15")),
+                             cache=search_cache)
+
+# What one web_search may hand the model: at most this many results, in about this many tokens
+MAX_RESULTS = int(os.getenv("RESEARCH_MAX_RESULTS", "5"))
+RESULT_TOKENS = int(os.getenv("RESEARCH_RESULT_TOKENS", "500"))
+
+# Saved research: a JSONL journal of ResearchNotes (older versions saved one .txt file
+# per note; those stay searchable) and its full-text index
+RESEARCH_DIR = "logs"
+JOURNAL_DIR = os.path.join(RESEARCH_DIR, "journal")
+research_journal = ResearchJournal(
+    JOURNAL_DIR,
+    max_bytes=int(os.getenv("RESEARCH_JOURNAL_MAX_BYTES", str(16 * 2**20))),
+    fsync=os.getenv("RESEARCH_JOURNAL_FSYNC", "1") != "0",
+)
+_URL = re.compile(r"https?://[^\s<>()\[\]\"']+")
+INDEX_PATH = os.getenv("RESEARCH_INDEX_PATH", os.path.join(RESEARCH_DIR, "research_index.db"))
+NOTE_RESULTS = 3
+NOTE_TOKENS = int(os.getenv("RESEARCH_NOTE_TOKENS", "800"))
+_research_index = None  # task opening the index
+
+
+def _open_research_index() -> ResearchIndex:
+    os.makedirs(os.path.dirname(INDEX_PATH) or ".", exist_ok=True)
+    index = ResearchIndex(INDEX_PATH)
+    # Only reads notes it hasn't indexed yet, but that may be many the first time
+    index.sync_journal(segment_paths(JOURNAL_DIR))
+    index.sync(RESEARCH_DIR)
+    return index
+
+
+async def get_research_index() -> ResearchIndex:
+    """The index of saved research, opened (and caught up with files saved elsewhere) on first use"""
+    global _research_index
+    if _research_index is None or (_research_index.done() and _research_index.exception()):
+        _research_index = asyncio.ensure_future(asyncio.to_thread(_open_research_index))
+    return await asyncio.shield(_research_index)
+
+
+# The docstring below is the tool description the model sees on every turn, so how
+# the search works is described here instead: DuckDuckGo Instant Answer, Wikipedia
+# OpenSearch, Wikipedia page extracts and DuckDuckGo HTML results are queried at once
+# and the answer is built from the best sources as soon as they have something
+# (search_engine.SearchEngine), over the shared keep-alive connections of
+# http_client.get_client. Results are cached per source (search_cache.SearchCache),
+# deduplicated and ranked across sources, and the best rendered within RESULT_TOKENS.
 async def web_search(ctx: RunContext[str], query: str) -> str:
     """
     Search the web for information using multiple sources.
@@ -15,200 +79,23 @@ async def web_search(ctx: RunContext[str], query: str) -> str:
         query: The search query to look up
     
     Returns:
-        Formatted search results with relevant information
+        Numbered search results, each with its title, a snippet and its URL
     """
     try:
-        headers = {
-            "User-Agent": "ResearchAgent/1.0 (Educational Project; Python/httpx)"
-        }
-        async with httpx.AsyncClient(follow_redirects=True, timeout=15.0, headers=headers) as client:
-            results = []
-            
-            # Method 1: Try DuckDuckGo Instant Answer API first (most reliable)
-            try:
-                ddg_api_response = await client.get(
-                    "https://api.duckduckgo.com/",
-                    params={
-                        "q": query,
-                        "format": "json",
-                        "no_html": 1,
-                        "skip_disambig": 1
-                    }
-                )
-                
-                if ddg_api_response.status_code == 200:
-                    ddg_data = ddg_api_response.json()
-                    
-                    # Get abstract text
-                    abstract = ddg_data.get("Abstract", "")
-                    heading = ddg_data.get("Heading", "")
-                    abstract_url = ddg_data.get("AbstractURL", "")
-                    
-                    if abstract:
-                        results.append(f"**{heading or 'Search Result'}**\n")
-                        results.append(abstract)
-                        if abstract_url:
-                            results.append(f"\n🔗 {abstract_url}\n")
-                    
-                    # Get related topics
-                    related = ddg_data.get("RelatedTopics", [])
-                    if related and not abstract:
-                        results.append("**Related Information:**\n")
-                        count = 0
-                        for topic in related[:5]:
-                            if isinstance(topic, dict):
-                                if "Text" in topic:
-                                    results.append(f"{count + 1}. {topic['Text']}")
-                                    if "FirstURL" in topic:
-                                        results.append(f"   🔗 {topic['FirstURL']}\n")
-                                    count += 1
-                                elif "Topics" in topic:
-                                    # Handle nested topics
-                                    for subtopic in topic["Topics"][:3]:
-                                        if isinstance(subtopic, dict) and "Text" in subtopic:
-                                            results.append(f"{count + 1}. {subtopic['Text']}")
-                                            if "FirstURL" in subtopic:
-                                                results.append(f"   🔗 {subtopic['FirstURL']}\n")
-                                            count += 1
-                            if count >= 5:
-                                break
-            except Exception as e:
-                pass
-            
-            # Method 2: Try Wikipedia OpenSearch API
-            if len(results) < 2:
-                try:
-                    wiki_response = await client.get(
-                        "https://en.wikipedia.org/w/api.php",
-                        params={
-                            "action": "opensearch",
-                            "search": query,
-                            "limit": 5,
-                            "namespace": 0,
-                            "format": "json"
-                        }
-                    )
-                    
-                    if wiki_response.status_code == 200:
-                        wiki_data = wiki_response.json()
-                        if len(wiki_data) >= 4 and wiki_data[1]:
-                            titles = wiki_data[1]
-                            descriptions = wiki_data[2]
-                            urls = wiki_data[3]
-                            
-                            # Only add if we have meaningful descriptions
-                            has_descriptions = any(desc for desc in descriptions if desc)
-                            
-                            if has_descriptions:
-                                if not results or "Wikipedia" not in "\n".join(results):
-                                    results.append(f"\n**Wikipedia Results:**\n")
-                                for i in range(min(len(titles), 3)):
-                                    if titles[i] and descriptions[i]:  # Only add if has description
-                                        results.append(f"{i+1}. **{titles[i]}**")
-                                        results.append(f"   {descriptions[i]}")
-                                        if i < len(urls) and urls[i]:
-                                            results.append(f"   🔗 {urls[i]}\n")
-                except Exception as e:
-                    pass
-            
-            # Method 3: Try to get Wikipedia page extract for more detailed info
-            if len(results) < 2:
-                try:
-                    # First try to search for relevant titles
-                    search_response = await client.get(
-                        "https://en.wikipedia.org/w/api.php",
-                        params={
-                            "action": "opensearch",
-                            "search": query,
-                            "limit": 1,
-                            "namespace": 0,
-                            "format": "json"
-                        }
-                    )
-                    
-                    search_term = query
-                    if search_response.status_code == 200:
-                        search_data = search_response.json()
-                        if len(search_data) >= 2 and search_data[1]:
-                            # Use the first search result title
-                            search_term = search_data[1][0]
-                    
-                    # Now get the extract for that page
-                    extract_response = await client.get(
-                        "https://en.wikipedia.org/w/api.php",
-                        params={
-                            "action": "query",
-                            "format": "json",
-                            "prop": "extracts|info",
-                            "exintro": True,
-                            "explaintext": True,
-                            "inprop": "url",
-                            "titles": search_term,
-                            "redirects": 1
-                        }
-                    )
-                    
-                    if extract_response.status_code == 200:
-                        extract_data = extract_response.json()
-                        pages = extract_data.get("query", {}).get("pages", {})
-                        for page_id, page in pages.items():
-                            if page_id != "-1" and "extract" in page:
-                                title = page.get("title", "")
-                                extract = page.get("extract", "")
-                                url = page.get("fullurl", f"https://en.wikipedia.org/wiki/{title.replace(' ', '_')}")
-                                if extract and len(extract) > 50:  # Only if meaningful content
-                                    # Limit extract to first 600 characters
-                                    extract = extract[:600] + "..." if len(extract) > 600 else extract
-                                    if not results:
-                                        results.append(f"**{title}**\n")
-                                    else:
-                                        results.append(f"\n**{title}**\n")
-                                    results.append(extract)
-                                    results.append(f"\n🔗 {url}\n")
-                except Exception as e:
-                    pass
-            
-            # Method 4: Use DuckDuckGo HTML scraping (simplified)
-            if not results:
-                try:
-                    ddg_response = await client.get(
-                        "https://html.duckduckgo.com/html/",
-                        params={"q": query},
-                        headers={
-                            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-                        },
-                        timeout=10.0
-                    )
-                    
-                    if ddg_response.status_code == 200:
-                        html = ddg_response.text
-                        # Simple regex to extract result snippets
-                        snippet_pattern = r'<a class="result__snippet"[^>]>(.?)</a>'
-                        snippets = re.findall(snippet_pattern, html, re.DOTALL)[:3]
-                        
-                        if snippets:
-                            results.append("**Web Results:**\n")
-                            for i, snippet in enumerate(snippets, 1):
-                                # Clean HTML tags
-                                clean_snippet = re.sub(r'<[^>]+>', '', snippet)
-                                clean_snippet = clean_snippet.strip()
-                                if clean_snippet:
-                                    results.append(f"{i}. {clean_snippet[:200]}")
-                except Exception as e:
-                    pass
+        results = await search_engine.search(get_client(), query)
+
+        if results:
+            return render_results(results, max_tokens=RESULT_TOKENS, max_results=MAX_RESULTS)
+        else:
+            return f"Unable to find detailed information for '{query}'. The search did not return results. Try rephrasing your query."
             
-            if results:
-                return "\n".join(results)
-            else:
-                return f"Unable to find detailed information for '{query}'. The search did not return results. Try rephrasing your query."
-                
     except Exception as e:
         return f"Search error: {str(e)[:150]}"
 
 
 async def save_research(ctx: RunContext[str], topic: str, content: str) -> str:
     """
-    Save research findings and agent's response to a file. Use this when the user 
+    Save research findings and agent's response to the research journal. Use this when the user 
     explicitly asks to save, store, or keep research information.
     
     IMPORTANT: The 'content' parameter should include:
@@ -233,28 +120,42 @@ async def save_research(ctx: RunContext[str], topic: str, content: str) -> str:
                    Sources: [wikipedia links]"
     """
     try:
-        # Create logs directory if it doesn't exist
-        os.makedirs("logs", exist_ok=True)
-        
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        safe_topic = "".join(c if c.isalnum() or c in (' ', '') else '' for c in topic)
-        safe_topic = safe_topic.replace(' ', '_')[:50]  # Limit length
-        filename = f"logs/research_{safe_topic}_{timestamp}.txt"
-        
-        with open(filename, "w", encoding="utf-8") as f:
-            f.write(f"Research Topic: {topic}\n")
-            f.write(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write("=" * 70 + "\n\n")
-            f.write(content)
-            f.write("\n\n" + "=" * 70)
-            f.write(f"\nSaved: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
+        note = ResearchNote(topic=topic, content=content, sources=list(dict.fromkeys(_URL.findall(content))))
+        path, offset = await research_journal.append(note)
+
+        # Indexing reads the segment and writes SQLite: keep it off the event loop
+        index = await get_research_index()
+        await asyncio.to_thread(index.sync_journal, [path])
         
-        return f"✅ Research saved successfully to: {filename}"
+        return f"✅ Research saved successfully to: {path} (entry at byte {offset})"
         
     except Exception as e:
         return f"❌ Error saving research: {str(e)}"
 
 
+async def search_saved_research(ctx: RunContext[str], query: str) -> str:
+    """
+    Search research saved earlier with save_research. Try this before web_search
+    when the topic may have been researched (and saved) before.
+    
+    Args:
+        ctx: The run context
+        query: Words to look for in saved research topics and findings
+    
+    Returns:
+        The best matching saved research (topic, date, findings and file), or a note that nothing matched
+    """
+    try:
+        index = await get_research_index()
+        notes = await asyncio.to_thread(index.search, query, NOTE_RESULTS)
+        if notes:
+            return render_results(notes, max_tokens=NOTE_TOKENS, max_results=NOTE_RESULTS)
+        return f"No saved research matches '{query}'. Use web_search to research it."
+        
+    except Exception as e:
+        return f"❌ Error searching saved research: {str(e)[:150]}"
+
+
 async def get_date_time(ctx: RunContext[str]) -> str:
     """
     Get the current date and time.